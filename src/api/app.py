@@ -0,0 +1,28 @@
+# ============================================================================
+# FILE: src/api/app.py
+# Applicazione FastAPI
+# ============================================================================
+
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from .routes import router, analysis_jobs, close_autolisters
+from .middleware import log_requests
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Avvia e ferma i worker della pipeline di analisi e chiude le sessioni HTTP"""
+    
+    await analysis_jobs.start()
+    yield
+    await analysis_jobs.stop()
+    await close_autolisters()
+
+# Serializzazione risposte con orjson (ListingResult annidato è il payload più pesante)
+app = FastAPI(
+    title="Vinted AutoLister API",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
+)
+app.middleware("http")(log_requests)
+app.include_router(router)
@@ -6,19 +6,36 @@
 from fastapi import Request
 import time
 import logging
+import random
+from ..config.settings import get_settings
+
+logger = logging.getLogger("api")
+
+# Percentuale di risposte riuscite loggate per i path ad alto traffico
+_LOG_SAMPLE_RATES = get_settings().LOG_SAMPLE_PATHS
 
 async def log_requests(request: Request, call_next):
     """Middleware per logging richieste API"""
     
-    start_time = time.time()
+    start_time = time.perf_counter_ns()
     
     response = await call_next(request)
     
-    process_time = time.time() - start_time
-    logging.info(
-        f"{request.method} {request.url.path} - "
-        f"Status: {response.status_code} - "
-        f"Time: {process_time:.2f}s"
+    # Errori (status >= 400) sempre loggati: il campionamento vale solo per le risposte riuscite
+    if response.status_code < 400:
+        sample_rate = _LOG_SAMPLE_RATES.get(request.url.path)
+        if sample_rate is not None and random.random() >= sample_rate:
+            return response
+    
+    process_time = (time.perf_counter_ns() - start_time) / 1e9
+    
+    # Formattazione differita: avviene solo se il livello INFO è abilitato
+    logger.info(
+        "%s %s - Status: %d - Time: %.3fs",
+        request.method,
+        request.url.path,
+        response.status_code,
+        process_time
     )
     
     return response
\ No newline at end of file
@@ -4,16 +4,120 @@
 # ============================================================================
 
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import Optional
+from fastapi.responses import ORJSONResponse
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel, ValidationError
+from typing import Optional, Dict, Any, List, Set, Type
 import asyncio
-from pathlib import Path
-import tempfile
+import base64
+import re
 from ..core.autolister import VintedAutoLister
+from ..core.price_scraper import VintedPriceScraper
 from ..models.listing import ListingResult
+from ..config.settings import get_settings
+from ..services.request_collapser import RequestCollapser
+from ..services.job_queue import JobQueue, JobQueueFullError
 
 router = APIRouter()
 
-@router.post("/analyze")
+# Pipeline /analyze eseguita in background (worker avviati nel lifespan dell'app)
+analysis_jobs = JobQueue(
+    workers=get_settings().ANALYZE_WORKERS,
+    max_size=get_settings().ANALYZE_QUEUE_SIZE,
+    ttl_hours=get_settings().ANALYZE_JOB_TTL_HOURS
+)
+
+# Riferimento al risultato di una sotto-richiesta precedente, es. "$0.suggested_price"
+_BATCH_REF_RE = re.compile(r"^\$(\d+)\.(.+)$")
+
+# Scraper unico per tutte le chiavi OpenAI: /analyze e /price-check condividono cache e scraping in corso
+price_scraper = VintedPriceScraper()
+
+# Autolister condivisi per chiave OpenAI (ordine di inserimento = uso più recente), chiusi allo shutdown
+AUTOLISTER_CACHE_SIZE = 8
+_autolisters: Dict[Optional[str], VintedAutoLister] = {}
+_closing: Set[asyncio.Task] = set()
+
+def _get_autolister(openai_key: Optional[str] = None) -> VintedAutoLister:
+    """Autolister condiviso per chiave OpenAI (riusato tra le richieste)"""
+    
+    autolister = _autolisters.pop(openai_key, None)
+    if autolister is None:
+        autolister = VintedAutoLister(openai_key, price_scraper=price_scraper)
+        
+        # La chiave arriva dal client: oltre il limite si chiude l'autolister usato meno di recente
+        if len(_autolisters) >= AUTOLISTER_CACHE_SIZE:
+            evicted = _autolisters.pop(next(iter(_autolisters)))
+            task = asyncio.ensure_future(evicted.aclose())
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+    
+    _autolisters[openai_key] = autolister
+    return autolister
+
+async def close_autolisters():
+    """Chiude le sessioni HTTP di tutti gli autolister condivisi e dello scraper"""
+    
+    autolisters = list(_autolisters.values())
+    _autolisters.clear()
+    await asyncio.gather(*(autolister.aclose() for autolister in autolisters), *_closing)
+    await price_scraper.aclose()
+
+class BatchSubRequest(BaseModel):
+    """Singola richiesta all'interno di un batch"""
+    method: str = "GET"
+    path: str
+    params: Dict[str, Any] = {}
+
+class BatchRequest(BaseModel):
+    """Lista ordinata di sotto-richieste da eseguire in una sola chiamata"""
+    requests: List[BatchSubRequest]
+    openai_key: Optional[str] = None
+
+async def _run_analysis(
+    autolister: VintedAutoLister,
+    image_data: bytes,
+    size: str,
+    condition: str,
+    target_speed: str,
+    content_style: str
+) -> ListingResult:
+    """Esegue la pipeline completa su un'immagine"""
+    
+    return await autolister.process_image_bytes(
+        image_data=image_data,
+        size=size,
+        condition=condition,
+        target_sale_speed=target_speed,
+        content_style=content_style
+    )
+
+async def _run_price_check(
+    autolister: VintedAutoLister,
+    brand: str,
+    item_type: str,
+    size: str,
+    condition: str,
+    target_speed: str = "normal"
+) -> Dict[str, Any]:
+    """Esegue l'analisi prezzi e ne restituisce il riepilogo"""
+    
+    result = await autolister.analyze_price_only(
+        brand=brand,
+        item_type=item_type,
+        size=size,
+        condition=condition,
+        target_sale_speed=target_speed
+    )
+    
+    return {
+        "suggested_price": result.suggested_price,
+        "price_range": result.price_range,
+        "market_position": result.market_position,
+        "total_listings": result.total_listings
+    }
+
+@router.post("/analyze", status_code=202)
 async def analyze_image(
     image: UploadFile = File(...),
     size: str = "M",
@@ -21,57 +125,250 @@ async def analyze_image(
     openai_key: Optional[str] = None,
     target_speed: str = "normal",
     content_style: str = "friendly"
-) -> ListingResult:
-    """Endpoint per analisi immagine e generazione annuncio"""
+):
+    """Endpoint per analisi immagine: accoda la pipeline e restituisce l'id del task"""
     
     try:
-        # Salva file temporaneo
-        with tempfile.NamedTemporaryFile(delete=False) as tmp:
-            tmp.write(await image.read())
-            tmp_path = tmp.name
+        # Lettura a blocchi: l'immagine resta in memoria, nessun file temporaneo
+        image_data = bytearray()
+        while chunk := await image.read(65536):
+            image_data.extend(chunk)
         
-        # Esegui analisi
-        autolister = VintedAutoLister(openai_key)
-        result = await autolister.process_image(
-            image_path=tmp_path,
-            size=size,
-            condition=condition,
-            target_sale_speed=target_speed,
-            content_style=content_style
-        )
+        autolister = _get_autolister(openai_key)
         
-        # Cleanup
-        Path(tmp_path).unlink(missing_ok=True)
+        async def job() -> Dict[str, Any]:
+            result = await _run_analysis(
+                autolister,
+                image_data,
+                size=size,
+                condition=condition,
+                target_speed=target_speed,
+                content_style=content_style
+            )
+            return jsonable_encoder(result)
         
-        return result
+        task_id = await analysis_jobs.submit(job)
         
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    
+    return ORJSONResponse(
+        status_code=202,
+        content={
+            "task_id": task_id,
+            "status": "pending",
+            "status_url": router.url_path_for("analysis_status", task_id=task_id)
+        }
+    )
+
+@router.get("/analyze/{task_id}", name="analysis_status")
+async def analysis_status(task_id: str) -> Dict[str, Any]:
+    """Stato del task di analisi; include il ListingResult quando completato"""
+    
+    status = await analysis_jobs.get_status(task_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Task non trovato o scaduto")
+    
+    return status
+
+async def _load_price_check(
+    brand: str,
+    item_type: str,
+    size: str,
+    condition: str,
+    target_speed: str
+) -> Dict[str, Any]:
+    """Loader condiviso dalle richieste /price-check identiche"""
+    
+    return await _run_price_check(
+        _get_autolister(None),
+        brand=brand,
+        item_type=item_type,
+        size=size,
+        condition=condition,
+        target_speed=target_speed
+    )
+
+# Richieste identiche concorrenti condividono un solo scraping
+_price_check_collapser = RequestCollapser(_load_price_check)
 
 @router.get("/price-check")
 async def price_check(
     brand: str,
     item_type: str,
     size: str,
-    condition: str = "Buono"
+    condition: str = "Buono",
+    target_speed: str = "normal"
 ):
     """Endpoint per controllo prezzi senza immagine"""
     
     try:
-        autolister = VintedAutoLister()
-        result = await autolister.analyze_price_only(
-            brand=brand,
-            item_type=item_type,
-            size=size,
-            condition=condition
+        return await _price_check_collapser.submit(
+            (brand, item_type, size, condition, target_speed),
+            brand, item_type, size, condition, target_speed
         )
+    
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+class BatchAnalyzeParams(BaseModel):
+    """Parametri della sotto-richiesta POST /analyze (immagine in base64 nel campo 'image')"""
+    image: str
+    size: str = "M"
+    condition: str = "Buono"
+    target_speed: str = "normal"
+    content_style: str = "friendly"
+
+class BatchPriceCheckParams(BaseModel):
+    """Parametri della sotto-richiesta GET /price-check"""
+    brand: str
+    item_type: str
+    size: str
+    condition: str = "Buono"
+    target_speed: str = "normal"
+
+def _validate_params(model: Type[BaseModel], params: Dict[str, Any]) -> BaseModel:
+    """Valida i parametri (riferimenti già risolti) con lo stesso schema dell'endpoint singolo"""
+    
+    try:
+        return model.model_validate(params)
+    except ValidationError as e:
+        errors = e.errors()
+        missing = [str(error["loc"][0]) for error in errors if error["type"] == "missing"]
+        if missing:
+            detail = f"Parametri mancanti: {', '.join(missing)}"
+        else:
+            detail = "Parametri non validi: " + ", ".join(
+                f"{error['loc'][0]} ({error['msg']})" for error in errors
+            )
+        raise HTTPException(status_code=422, detail=detail)
+
+async def _batch_analyze(autolister: VintedAutoLister, params: Dict[str, Any]) -> ListingResult:
+    """Sotto-richiesta POST /analyze"""
+    
+    analyze_params = _validate_params(BatchAnalyzeParams, params)
+    
+    try:
+        image_data = base64.b64decode(analyze_params.image, validate=True)
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Immagine base64 non valida")
+    
+    return await _run_analysis(
+        autolister,
+        image_data,
+        size=analyze_params.size,
+        condition=analyze_params.condition,
+        target_speed=analyze_params.target_speed,
+        content_style=analyze_params.content_style
+    )
+
+async def _batch_price_check(autolister: VintedAutoLister, params: Dict[str, Any]) -> Dict[str, Any]:
+    """Sotto-richiesta GET /price-check"""
+    
+    price_params = _validate_params(BatchPriceCheckParams, params)
+    
+    return await _run_price_check(
+        autolister,
+        brand=price_params.brand,
+        item_type=price_params.item_type,
+        size=price_params.size,
+        condition=price_params.condition,
+        target_speed=price_params.target_speed
+    )
+
+_BATCH_HANDLERS = {
+    ("POST", "/analyze"): _batch_analyze,
+    ("GET", "/price-check"): _batch_price_check,
+}
+
+async def _resolve_batch_params(
+    params: Dict[str, Any],
+    responses: List["asyncio.Task"],
+    index: int
+) -> Dict[str, Any]:
+    """Sostituisce i riferimenti "$i.campo" con i valori delle risposte precedenti"""
+    
+    resolved = {}
+    
+    for name, value in params.items():
+        match = _BATCH_REF_RE.match(value) if isinstance(value, str) else None
         
-        return {
-            "suggested_price": result.suggested_price,
-            "price_range": result.price_range,
-            "market_position": result.market_position,
-            "total_listings": result.total_listings
-        }
+        if match:
+            ref_index = int(match.group(1))
+            if ref_index >= index:
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Riferimento non valido: {value}"
+                )
+            
+            response = await responses[ref_index]
+            if response["status"] != 200:
+                raise HTTPException(
+                    status_code=424,
+                    detail=f"La richiesta {ref_index} è fallita"
+                )
+            
+            value = response["body"]
+            try:
+                for key in match.group(2).split("."):
+                    value = value[int(key)] if isinstance(value, list) else value[key]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise HTTPException(
+                    status_code=422,
+                    detail=f"Campo non trovato: {match.group(0)}"
+                )
+        
+        resolved[name] = value
+    
+    return resolved
+
+async def _run_sub_request(
+    autolister: VintedAutoLister,
+    index: int,
+    sub_request: BatchSubRequest,
+    responses: List["asyncio.Task"]
+) -> Dict[str, Any]:
+    """Esegue una sotto-richiesta del batch e ne restituisce status e body"""
+    
+    try:
+        handler = _BATCH_HANDLERS.get((sub_request.method.upper(), sub_request.path))
+        if handler is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Endpoint non supportato: {sub_request.method} {sub_request.path}"
+            )
+        
+        params = await _resolve_batch_params(sub_request.params, responses, index)
+        body = await handler(autolister, params)
         
+        return {"status": 200, "body": jsonable_encoder(body)}
+    
+    except HTTPException as e:
+        return {"status": e.status_code, "body": {"detail": e.detail}}
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        return {"status": 500, "body": {"detail": str(e)}}
+
+@router.post("/batch")
+async def batch(batch_request: BatchRequest) -> List[Dict[str, Any]]:
+    """Endpoint per eseguire più richieste /analyze e /price-check in una sola chiamata"""
+    
+    settings = get_settings()
+    if len(batch_request.requests) > settings.BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Massimo {settings.BATCH_MAX_REQUESTS} richieste per batch"
+        )
+    
+    # Un solo autolister condiviso da tutte le sotto-richieste
+    autolister = _get_autolister(batch_request.openai_key)
+    
+    # I task vengono creati in ordine: la richiesta i può attendere solo le precedenti
+    responses: List[asyncio.Task] = []
+    for index, sub_request in enumerate(batch_request.requests):
+        responses.append(asyncio.ensure_future(
+            _run_sub_request(autolister, index, sub_request, responses)
+        ))
+    
+    return await asyncio.gather(*responses)
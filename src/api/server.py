@@ -0,0 +1,36 @@
+# ============================================================================
+# FILE: src/api/server.py
+# Avvio server ASGI (uvicorn)
+# ============================================================================
+
+import uvicorn
+from ..config.settings import get_settings
+
+def main():
+    """Avvia il server API con uvloop/httptools e più worker"""
+    
+    settings = get_settings()
+    
+    if settings.API_RELOAD:
+        # --reload non è compatibile con più worker: solo per sviluppo
+        uvicorn.run(
+            "src.api.app:app",
+            host=settings.API_HOST,
+            port=settings.API_PORT,
+            reload=True
+        )
+        return
+    
+    # Access log di uvicorn disattivato: le richieste sono già loggate dal middleware
+    uvicorn.run(
+        "src.api.app:app",
+        host=settings.API_HOST,
+        port=settings.API_PORT,
+        workers=settings.UVICORN_WORKERS,
+        loop="uvloop",
+        http="httptools",
+        access_log=False
+    )
+
+if __name__ == "__main__":
+    main()
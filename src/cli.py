@@ -5,10 +5,33 @@
 
 import click
 import asyncio
-from typing import Optional
+import csv
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
 from core.autolister import VintedAutoLister
 
+# uvloop (incluso in uvicorn[standard]) se disponibile
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+CONDITIONS = ["Nuovo con etichetta", "Ottimo", "Buono", "Discreto", "Rovinato"]
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def _run(coro):
+    """Esegue una coroutine sull'event loop condiviso dal processo CLI"""
+    
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop.run_until_complete(coro)
+
 @click.group()
 def cli():
     """Vinted AutoLister - CLI Tool"""
@@ -18,7 +41,7 @@ def cli():
 @click.argument("image_path", type=click.Path(exists=True))
 @click.option("--size", "-s", required=True, help="Taglia capo (XS, S, M, L, XL, XXL, Unica)")
 @click.option("--condition", "-c", required=True, 
-              type=click.Choice(["Nuovo con etichetta", "Ottimo", "Buono", "Discreto", "Rovinato"]),
+              type=click.Choice(CONDITIONS),
               help="Condizione capo")
 @click.option("--openai-key", "-k", help="OpenAI API Key (opzionale)")
 def analyze(image_path: str, size: str, condition: str, openai_key: Optional[str]):
@@ -27,14 +50,15 @@ def analyze(image_path: str, size: str, condition: str, openai_key: Optional[str
     click.echo("🚀 Avvio analisi immagine...")
     
     try:
-        autolister = VintedAutoLister(openai_key)
-        result = asyncio.run(
-            autolister.process_image(
-                image_path=image_path,
-                size=size,
-                condition=condition
-            )
-        )
+        async def run():
+            async with VintedAutoLister(openai_key) as autolister:
+                return await autolister.process_image(
+                    image_path=image_path,
+                    size=size,
+                    condition=condition
+                )
+        
+        result = _run(run())
         
         click.echo("\n✅ Annuncio generato con successo!")
         click.echo(f"\n📌 Titolo: {result.listing.title}")
@@ -54,21 +78,24 @@ def analyze(image_path: str, size: str, condition: str, openai_key: Optional[str
 @click.argument("item_type", required=True)
 @click.argument("size", required=True)
 @click.argument("condition", required=True)
-def price_check(brand: str, item_type: str, size: str, condition: str):
+@click.option("--refresh", is_flag=True, help="Ignora la cache e scarica prezzi aggiornati")
+def price_check(brand: str, item_type: str, size: str, condition: str, refresh: bool):
     """Controlla prezzi di mercato senza analisi immagine"""
     
     click.echo(f"🔍 Ricerco prezzi per {brand} {item_type} taglia {size}...")
     
     try:
-        autolister = VintedAutoLister()
-        result = asyncio.run(
-            autolister.analyze_price_only(
-                brand=brand,
-                item_type=item_type,
-                size=size,
-                condition=condition
-            )
-        )
+        async def run():
+            async with VintedAutoLister() as autolister:
+                return await autolister.analyze_price_only(
+                    brand=brand,
+                    item_type=item_type,
+                    size=size,
+                    condition=condition,
+                    force_refresh=refresh
+                )
+        
+        result = _run(run())
         
         click.echo("\n📊 Risultati Analisi Prezzi:")
         click.echo(f"- Prezzo suggerito: {result.suggested_price}€")
@@ -80,5 +107,107 @@ def price_check(brand: str, item_type: str, size: str, condition: str):
     except Exception as e:
         click.echo(f"\n❌ Errore: {str(e)}", err=True)
 
+def _load_batch_metadata(csv_path: str) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """Legge il CSV (file,size,condition) con taglia e condizione per immagine"""
+    
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return {
+            row["file"]: (row.get("size") or None, row.get("condition") or None)
+            for row in csv.DictReader(f)
+        }
+
+def _echo_batch_result(path: Path, result):
+    """Stampa l'esito di una singola immagine del batch"""
+    
+    if isinstance(result, Exception):
+        click.echo(f"\n❌ {path.name}: {str(result)}", err=True)
+    else:
+        click.echo(f"\n✅ {path.name}")
+        click.echo(f"📌 Titolo: {result.listing.title}")
+        click.echo(f"💰 Prezzo: {result.listing.price}€")
+
+async def _process_batch(
+    autolister: VintedAutoLister,
+    jobs: List[Tuple[Path, str, str]],
+    concurrency: int
+) -> int:
+    """Processa le immagini in parallelo (al massimo 'concurrency' alla volta) e restituisce i fallimenti"""
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def process(path: Path, size: str, condition: str):
+        async with semaphore:
+            try:
+                return path, await autolister.process_image(
+                    image_path=str(path),
+                    size=size,
+                    condition=condition
+                )
+            except Exception as e:
+                return path, e
+    
+    failures = 0
+    
+    # Risultati stampati appena pronti, senza attendere l'immagine più lenta
+    async with autolister:
+        for next_result in asyncio.as_completed([process(*job) for job in jobs]):
+            path, result = await next_result
+            failures += isinstance(result, Exception)
+            _echo_batch_result(path, result)
+    
+    return failures
+
+@cli.command()
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@click.option("--size", "-s", help="Taglia di default (XS, S, M, L, XL, XXL, Unica)")
+@click.option("--condition", "-c", type=click.Choice(CONDITIONS), help="Condizione di default")
+@click.option("--metadata", "-m", type=click.Path(exists=True, dir_okay=False),
+              help="CSV con colonne file,size,condition per le singole immagini")
+@click.option("--concurrency", "-j", default=8, show_default=True, type=click.IntRange(min=1),
+              help="Immagini processate contemporaneamente")
+@click.option("--openai-key", "-k", help="OpenAI API Key (opzionale)")
+def batch(
+    directory: str,
+    size: Optional[str],
+    condition: Optional[str],
+    metadata: Optional[str],
+    concurrency: int,
+    openai_key: Optional[str]
+):
+    """Analizza in parallelo tutte le immagini di una cartella"""
+    
+    image_paths = sorted(
+        p for p in Path(directory).iterdir()
+        if p.suffix.lower() in IMAGE_EXTENSIONS
+    )
+    
+    if not image_paths:
+        click.echo("⚠️ Nessuna immagine trovata nella cartella")
+        return
+    
+    overrides = _load_batch_metadata(metadata) if metadata else {}
+    
+    jobs = []
+    for path in image_paths:
+        image_size, image_condition = overrides.get(path.name, (None, None))
+        image_size = image_size or size
+        image_condition = image_condition or condition
+        
+        if not image_size or image_condition not in CONDITIONS:
+            click.echo(f"⚠️ {path.name}: taglia o condizione mancante/non valida, saltata", err=True)
+            continue
+        
+        jobs.append((path, image_size, image_condition))
+    
+    if not jobs:
+        return
+    
+    click.echo(f"🚀 Avvio analisi di {len(jobs)} immagini...")
+    
+    autolister = VintedAutoLister(openai_key)
+    failures = _run(_process_batch(autolister, jobs, concurrency))
+    
+    click.echo(f"\n🏁 Completate: {len(jobs) - failures}/{len(jobs)}")
+
 if __name__ == "__main__":
     cli()
\ No newline at end of file
@@ -6,12 +6,12 @@
 import logging
 from pathlib import Path
 from datetime import datetime
-from ..config.settings import Settings
+from ..config.settings import get_settings
 
 def setup_logging():
     """Configura sistema di logging"""
     
-    settings = Settings()
+    settings = get_settings()
     
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
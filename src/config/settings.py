@@ -3,8 +3,20 @@
 # Configurazioni e costanti
 # ============================================================================
 
-from pydantic_settings import BaseSettings
-from typing import Optional
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+from types import MappingProxyType
+from typing import Mapping, Optional
+from functools import lru_cache
+
+# Moltiplicatori prezzo per condizione (immutabili, condivisi senza copie)
+CONDITION_MULTIPLIERS = MappingProxyType({
+    "Nuovo con etichetta": 1.2,
+    "Ottimo": 1.0,
+    "Buono": 0.85,
+    "Discreto": 0.7,
+    "Rovinato": 0.5
+})
 
 class Settings(BaseSettings):
     """Configurazioni applicazione"""
@@ -15,25 +27,53 @@ class Settings(BaseSettings):
     OPENAI_TEXT_MODEL: str = "gpt-4"
     VISION_MAX_TOKENS: int = 300
     TEXT_MAX_TOKENS: int = 500
+    OPENAI_MAX_RETRIES: int = 3  # tentativi per chiamata (errori transitori: rate limit, timeout, 5xx)
+    VISION_CACHE_TTL_DAYS: int = 30
+    VISION_MEMO_MAX_ENTRIES: int = 256
+    CONTENT_CACHE_TTL_HOURS: int = 24
     
     # Vinted
     VINTED_BASE_URL: str = "https://www.vinted.it"
     VINTED_API_TIMEOUT: int = 30
     VINTED_MAX_RETRIES: int = 3
+    VINTED_RATE_LIMIT: int = 15  # richieste per VINTED_RATE_PERIOD
+    VINTED_RATE_PERIOD: int = 60  # secondi
+    VINTED_RESPONSE_CACHE_TTL: int = 600  # secondi, cache su file condivisa tra processi
+    VINTED_RESPONSE_STALE_TTL: int = 600  # secondi oltre il TTL in cui si serve il dato scaduto aggiornandolo in background
+    VINTED_EMPTY_RESPONSE_CACHE_TTL: int = 60  # secondi, ricerche senza risultati (smorza i tentativi ripetuti)
     
     # Pricing
-    CONDITION_MULTIPLIERS: dict = {
-        "Nuovo con etichetta": 1.2,
-        "Ottimo": 1.0,
-        "Buono": 0.85,
-        "Discreto": 0.7,
-        "Rovinato": 0.5
-    }
+    CONDITION_MULTIPLIERS: Mapping[str, float] = Field(
+        default_factory=lambda: CONDITION_MULTIPLIERS,
+        validate_default=False
+    )
     
     # Performance
-    MAX_IMAGE_SIZE: int = 1024  # px
-    IMAGE_QUALITY: int = 85  # %
+    MAX_IMAGE_SIZE: int = 768  # px
+    IMAGE_QUALITY: int = 80  # %
+    VISION_IMAGE_DETAIL: str = "low"  # low, high, auto
+    CACHE_DIR: str = "cache"  # database SQLite condiviso da processi, worker e riavvii (volume in Docker)
     
-    class Config:
-        env_file = ".env"
-        env_file_encoding = "utf-8"
\ No newline at end of file
+    # API
+    API_HOST: str = "0.0.0.0"
+    API_PORT: int = 8000
+    API_RELOAD: bool = False
+    UVICORN_WORKERS: int = 4
+    BATCH_MAX_REQUESTS: int = 50
+    ANALYZE_WORKERS: int = 2
+    ANALYZE_QUEUE_SIZE: int = 100
+    ANALYZE_JOB_TTL_HOURS: float = 1
+    LOG_SAMPLE_PATHS: dict = {
+        "/price-check": 0.1
+    }
+    
+    model_config = SettingsConfigDict(
+        env_file=".env",
+        env_file_encoding="utf-8",
+        frozen=True
+    )
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Istanza condivisa delle configurazioni (letta una sola volta per processo)"""
+    return Settings()
\ No newline at end of file
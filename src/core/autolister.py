@@ -3,27 +3,50 @@
 # Main orchestrator - coordina tutti i componenti
 # ============================================================================
 
+import logging
 import time
-from typing import Optional, Dict, Any
+from typing import Optional, Callable, List, Sequence
 from pathlib import Path
 
-from ..models.product import ProductData
 from ..models.listing import ListingData, ListingResult
-from ..models.price import PriceAnalysis
+from ..models.price import PriceAnalysis, VintedListing
 from .vision_analyzer import VisionAnalyzer
 from .price_scraper import VintedPriceScraper
 from .price_analyzer import PriceAnalyzer
 from .content_generator import ContentGenerator
 
+logger = logging.getLogger(__name__)
+
 class VintedAutoLister:
     """Orchestrator principale per il processo di listing automatico"""
     
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(
+        self,
+        openai_api_key: Optional[str] = None,
+        price_scraper: Optional[VintedPriceScraper] = None
+    ):
         self.vision_analyzer = VisionAnalyzer(openai_api_key)
-        self.price_scraper = VintedPriceScraper()
+        # Scraper condivisibile tra più autolister (es. uno per chiave OpenAI): chi lo passa lo chiude
+        self.price_scraper = price_scraper or VintedPriceScraper()
+        self._owns_scraper = price_scraper is None
         self.price_analyzer = PriceAnalyzer()
         self.content_generator = ContentGenerator(openai_api_key)
     
+    async def __aenter__(self) -> "VintedAutoLister":
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def aclose(self):
+        """Rilascia le risorse condivise (sessioni HTTP di scraper e OpenAI)"""
+        
+        if self._owns_scraper:
+            await self.price_scraper.aclose()
+        await self.vision_analyzer.openai_service.aclose()
+        if self.content_generator.openai_service:
+            await self.content_generator.openai_service.aclose()
+    
     async def process_image(
         self,
         image_path: str,
@@ -34,24 +57,66 @@ class VintedAutoLister:
     ) -> ListingResult:
         """Processo completo: da immagine a listing pronto"""
         
+        try:
+            image_data = self._load_image(image_path)
+        except Exception as e:
+            logger.error("Error loading image: %s", e)
+            raise AutoListerError(f"Processing failed: {str(e)}")
+        
+        return await self.process_image_bytes(
+            image_data=image_data,
+            size=size,
+            condition=condition,
+            target_sale_speed=target_sale_speed,
+            content_style=content_style
+        )
+    
+    async def process_image_bytes(
+        self,
+        image_data: bytes,
+        size: str,
+        condition: str,
+        target_sale_speed: str = "normal",
+        content_style: str = "friendly"
+    ) -> ListingResult:
+        """Processo completo a partire dai bytes dell'immagine (senza file su disco)"""
+        
+        return await self.process_images_bytes(
+            images=[image_data],
+            size=size,
+            condition=condition,
+            target_sale_speed=target_sale_speed,
+            content_style=content_style
+        )
+    
+    async def process_images_bytes(
+        self,
+        images: Sequence[bytes],
+        size: str,
+        condition: str,
+        target_sale_speed: str = "normal",
+        content_style: str = "friendly",
+        on_content: Optional[Callable[[str], None]] = None
+    ) -> ListingResult:
+        """Processo completo da più foto dello stesso capo (una sola chiamata Vision)"""
+        
         start_time = time.time()
         
         try:
-            # 1. Analisi immagine
-            print("🔍 Analyzing image...")
-            image_data = self._load_image(image_path)
-            product_data = self.vision_analyzer.analyze_image(image_data)
+            # 1. Analisi immagini (Pillow in un thread, chiamata OpenAI asincrona)
+            logger.debug("Analyzing %d image(s)", len(images))
+            product_data = await self.vision_analyzer.analyze_images_async(images)
             
             # 2. Ricerca prezzi
-            print("💰 Searching market prices...")
-            similar_listings = await self.price_scraper.search_similar_items(
-                brand=product_data.brand,
-                item_type=product_data.type.value,
-                size=size
+            logger.debug("Searching market prices")
+            similar_listings = await self._search_similar_items(
+                product_data.brand,
+                product_data.type.value,
+                size
             )
             
             # 3. Analisi prezzi
-            print("📊 Analyzing price data...")
+            logger.debug("Analyzing price data")
             price_analysis = self.price_analyzer.analyze_prices(
                 listings=similar_listings,
                 condition=condition,
@@ -59,13 +124,14 @@ class VintedAutoLister:
             )
             
             # 4. Generazione contenuti
-            print("✍️ Generating content...")
-            content = self.content_generator.generate_listing_content(
+            logger.debug("Generating content")
+            content = await self.content_generator.generate_listing_content_async(
                 product_data=product_data,
                 size=size,
                 condition=condition,
                 price=price_analysis.suggested_price,
-                style=content_style
+                style=content_style,
+                on_content=on_content
             )
             
             # 5. Assembla risultato finale
@@ -98,13 +164,26 @@ class VintedAutoLister:
                 confidence_score=overall_confidence
             )
             
-            print(f"✅ Processing completed in {processing_time:.2f}s")
+            logger.info("Processing completed in %.2fs", processing_time)
             return result
             
         except Exception as e:
-            print(f"❌ Error during processing: {str(e)}")
+            logger.exception("Error during processing")
             raise AutoListerError(f"Processing failed: {str(e)}")
     
+    async def _search_similar_items(
+        self,
+        brand: str,
+        item_type: str,
+        size: str,
+        force_refresh: bool = False
+    ) -> List[VintedListing]:
+        """Ricerca prezzi (raggruppamento delle richieste identiche e cache sono nello scraper)"""
+        
+        return await self.price_scraper.search_similar_items(
+            brand, item_type, size, force_refresh=force_refresh
+        )
+    
     def _load_image(self, image_path: str) -> bytes:
         """Carica immagine da file"""
         path = Path(image_path)
@@ -144,19 +223,18 @@ class VintedAutoLister:
         brand: str,
         item_type: str, 
         size: str,
-        condition: str
+        condition: str,
+        target_sale_speed: str = "normal",
+        force_refresh: bool = False
     ) -> PriceAnalysis:
         """Solo analisi prezzi senza processare immagine"""
         
-        similar_listings = await self.price_scraper.search_similar_items(
-            brand=brand,
-            item_type=item_type,
-            size=size
-        )
+        similar_listings = await self._search_similar_items(brand, item_type, size, force_refresh)
         
         return self.price_analyzer.analyze_prices(
             listings=similar_listings,
-            condition=condition
+            condition=condition,
+            target_sale_speed=target_sale_speed
         )
 
 class AutoListerError(Exception):
@@ -3,14 +3,94 @@
 # Generazione contenuti AI
 # ============================================================================
 
-import json
-import re
-from typing import Optional, Dict, Any
+import asyncio
+import logging
+from dataclasses import asdict
+from types import MappingProxyType
+from typing import Optional, Dict, Any, Callable
 from ..models.product import ProductData
-from ..models.listing import ListingData
 from ..services.openai_service import OpenAIService
-from ..utils.text_utils import TextValidator
-from ..config.settings import Settings
+from ..services.cache_service import CacheService
+from ..utils.text_utils import TextValidator, extract_json_object
+from ..config.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Istruzioni di stile per il prompt AI (costanti: non ricostruite a ogni generazione)
+_STYLE_INSTRUCTIONS = MappingProxyType({
+    "friendly": "Usa un tono amichevole e caloroso, come se stessi parlando a un amico",
+    "professional": "Mantieni un tono professionale ma accessibile",
+    "trendy": "Usa un linguaggio moderno e alla moda, con emoji appropriate"
+})
+
+# Template titoli, in ordine di preferenza (il primo entro 60 caratteri vince)
+_TITLE_TEMPLATES = (
+    "{brand} {type} {color} - Taglia {size}",
+    "{type_title} {brand} taglia {size} - {condition}",
+    "✨ {brand} {type} {color} T.{size}"
+)
+
+# Template descrizioni (costanti di modulo, riempiti con un solo format_map)
+_FRIENDLY_DESCRIPTION = """Ciao! Vendo questo bellissimo {type_lower} {brand} 😊
+
+📏 Taglia: {size}
+🎨 Colore: {color}
+🧵 Materiale: {material}
+✨ Condizione: {condition}
+
+Il capo è stato curato con amore e si presenta in ottime condizioni! Perfetto per arricchire il tuo guardaroba con un tocco di stile.
+
+💰 Prezzo: {price}€ (trattabile per acquisti multipli!)
+📦 Spedizione veloce e imballaggio accurato
+💬 Contattami pure per foto aggiuntive o qualsiasi domanda!
+
+#vinted #abbigliamento #secondamano #sostenibile #{brand_lower} #{type_tag}"""
+
+_PROFESSIONAL_DESCRIPTION = """In vendita {type_lower} {brand} in {condition_lower}.
+
+DETTAGLI PRODOTTO:
+• Marca: {brand}
+• Tipo: {type}
+• Taglia: {size}
+• Colore: {color}
+• Materiale: {material}
+• Condizione: {condition}
+
+Il capo è stato conservato con cura e non presenta difetti evidenti. Ideale per chi cerca qualità a prezzo conveniente.
+
+CONDIZIONI DI VENDITA:
+• Prezzo: {price}€
+• Spedizione: disponibile con tracking
+• Pagamento: solo tramite piattaforma Vinted
+• Restituzione: secondo policy Vinted
+
+Per ulteriori informazioni o foto aggiuntive, non esitate a contattarmi.
+
+#abbigliamento #preloved #{brand_lower}"""
+
+_TRENDY_DESCRIPTION = """🔥 SUPER FIND 🔥
+
+{type_title} {brand} che non può mancare nel tuo closet! 💅
+
+✨ SPECS:
+📐 Size: {size}
+🌈 Color: {color}
+🔗 Material: {material}
+💯 Condition: {condition}
+
+Questo piece è davvero special e ti darà quel look che stavi cercando! Perfect per ogni occasion 🌟
+
+💸 Price: {price}€ 
+📲 DM me per più info!
+🚚 Fast shipping guaranteed
+
+#vintedfinds #thrifted #sustainable #fashion #{brand_lower} #ootd #preloved"""
+
+_DESCRIPTION_TEMPLATES = MappingProxyType({
+    "friendly": _FRIENDLY_DESCRIPTION,
+    "professional": _PROFESSIONAL_DESCRIPTION,
+    "trendy": _TRENDY_DESCRIPTION
+})
 
 class ContentGenerator:
     """Genera titoli e descrizioni ottimizzate per Vinted"""
@@ -18,7 +98,8 @@ class ContentGenerator:
     def __init__(self, api_key: Optional[str] = None):
         self.openai_service = OpenAIService(api_key) if api_key else None
         self.text_validator = TextValidator()
-        self.settings = Settings()
+        self.settings = get_settings()
+        self.cache = CacheService(ttl_hours=self.settings.CONTENT_CACHE_TTL_HOURS) if api_key else None
     
     def generate_listing_content(
         self,
@@ -28,43 +109,105 @@ class ContentGenerator:
         price: float,
         style: str = "friendly"
     ) -> Dict[str, str]:
-        """Genera titolo e descrizione per il listing"""
+        """Genera titolo e descrizione per il listing (sincrono, per chi non ha un event loop)"""
+        
+        async def generate() -> Dict[str, str]:
+            try:
+                return await self.generate_listing_content_async(product_data, size, condition, price, style)
+            finally:
+                # La sessione HTTP è legata al loop temporaneo di asyncio.run
+                if self.openai_service:
+                    await self.openai_service.aclose()
+        
+        return asyncio.run(generate())
+    
+    async def generate_listing_content_async(
+        self,
+        product_data: ProductData,
+        size: str,
+        condition: str,
+        price: float,
+        style: str = "friendly",
+        on_content: Optional[Callable[[str], None]] = None
+    ) -> Dict[str, str]:
+        """Genera titolo e descrizione per il listing (on_content riceve il testo parziale in streaming)"""
         
         if self.openai_service:
-            return self._generate_with_ai(product_data, size, condition, price, style)
+            return await self._generate_with_ai(product_data, size, condition, price, style, on_content)
         else:
             return self._generate_with_templates(product_data, size, condition, price, style)
     
-    def _generate_with_ai(
+    async def _generate_with_ai(
         self,
         product_data: ProductData,
-        size: str, 
+        size: str,
         condition: str,
         price: float,
-        style: str
+        style: str,
+        on_content: Optional[Callable[[str], None]] = None
     ) -> Dict[str, str]:
         """Genera contenuto usando OpenAI"""
         
+        # Stessi dati prodotto e input: riusa il contenuto già generato (SQLite in un thread)
+        cache_key = self._content_cache_key(product_data, size, condition, price, style)
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached is not None:
+            return cached
+        
         prompt = self._build_generation_prompt(product_data, size, condition, price, style)
         
         try:
-            response = self.openai_service.text_completion(
-                prompt=prompt,
-                max_tokens=self.settings.TEXT_MAX_TOKENS,
-                temperature=0.7
-            )
-            
-            content = self._parse_ai_response(response)
+            if on_content is None:
+                response = await self.openai_service.atext_completion(
+                    prompt=prompt,
+                    max_tokens=self.settings.TEXT_MAX_TOKENS,
+                    temperature=0.7
+                )
+            else:
+                response = await self._stream_completion(prompt, on_content)
             
             # Validazione e cleanup
-            content = self._validate_and_clean_content(content)
-            
+            content = self._validate_and_clean_content(self._parse_ai_response(response))
+            await asyncio.to_thread(self.cache.set, cache_key, content)
             return content
             
-        except Exception as e:
-            print(f"AI generation failed: {e}")
+        except Exception:
+            logger.exception("AI generation failed, falling back to templates")
             return self._generate_with_templates(product_data, size, condition, price, style)
     
+    async def _stream_completion(self, prompt: str, on_content: Callable[[str], None]) -> dict:
+        """Completion in streaming: notifica il testo accumulato a ogni frammento"""
+        
+        parts = []
+        async for delta in self.openai_service.atext_completion_stream(
+            prompt=prompt,
+            max_tokens=self.settings.TEXT_MAX_TOKENS,
+            temperature=0.7
+        ):
+            parts.append(delta)
+            on_content(''.join(parts))
+        
+        # Stessa forma della risposta non in streaming: il parsing resta invariato
+        return {"choices": [{"message": {"content": ''.join(parts)}}]}
+    
+    def _content_cache_key(
+        self,
+        product_data: ProductData,
+        size: str,
+        condition: str,
+        price: float,
+        style: str
+    ) -> Dict[str, Any]:
+        """Chiave cache del contenuto AI (dati prodotto + input dell'annuncio)"""
+        
+        return {
+            "content": asdict(product_data),
+            "size": size,
+            "condition": condition,
+            "price": price,
+            "style": style
+        }
+    
     def _build_generation_prompt(
         self,
         product_data: ProductData,
@@ -75,12 +218,6 @@ class ContentGenerator:
     ) -> str:
         """Costruisce prompt ottimizzato per generazione contenuti"""
         
-        style_instructions = {
-            "friendly": "Usa un tono amichevole e caloroso, come se stessi parlando a un amico",
-            "professional": "Mantieni un tono professionale ma accessibile",
-            "trendy": "Usa un linguaggio moderno e alla moda, con emoji appropriate"
-        }
-        
         features_text = ""
         if product_data.additional_features:
             features_text = f"Caratteristiche aggiuntive: {product_data.additional_features}"
@@ -98,7 +235,7 @@ class ContentGenerator:
         - Prezzo: {price}€
         {features_text}
         
-        STILE: {style_instructions.get(style, style_instructions["friendly"])}
+        STILE: {_STYLE_INSTRUCTIONS.get(style, _STYLE_INSTRUCTIONS["friendly"])}
         
         REQUISITI:
         - Titolo: massimo 60 caratteri, accattivante e informativo
@@ -121,17 +258,13 @@ class ContentGenerator:
             content = response['choices'][0]['message']['content']
             
             # Cerca JSON nella risposta
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if json_match:
-                data = json.loads(json_match.group())
-                return {
-                    "title": data.get("title", ""),
-                    "description": data.get("description", "")
-                }
-            else:
-                raise ValueError("No JSON found in AI response")
+            data = extract_json_object(content)
+            return {
+                "title": data.get("title", ""),
+                "description": data.get("description", "")
+            }
                 
-        except (json.JSONDecodeError, KeyError, ValueError):
+        except (KeyError, ValueError):
             raise ContentGenerationError("Failed to parse AI response")
     
     def _generate_with_templates(
@@ -144,95 +277,33 @@ class ContentGenerator:
     ) -> Dict[str, str]:
         """Genera contenuto usando template predefiniti"""
         
+        # Valori derivati (lower/title/replace) calcolati una volta, condivisi da titolo e descrizione
+        product_type = product_data.type.value
+        values = {
+            "brand": product_data.brand,
+            "brand_lower": product_data.brand.lower(),
+            "type": product_type,
+            "type_lower": product_type.lower(),
+            "type_title": product_type.title(),
+            "type_tag": product_type.replace('-', ''),
+            "color": product_data.color,
+            "material": product_data.material,
+            "size": size,
+            "condition": condition,
+            "condition_lower": condition.lower(),
+            "price": price
+        }
+        
         # Template per titoli
-        title_templates = [
-            f"{product_data.brand} {product_data.type.value} {product_data.color} - Taglia {size}",
-            f"{product_data.type.value.title()} {product_data.brand} taglia {size} - {condition}",
-            f"✨ {product_data.brand} {product_data.type.value} {product_data.color} T.{size}"
-        ]
+        titles = [template.format_map(values) for template in _TITLE_TEMPLATES]
         
         # Seleziona titolo che rispetta limite caratteri
-        title = next((t for t in title_templates if len(t) <= 60), title_templates[0][:60])
-        
-        # Template descrizione basato su stile
-        if style == "trendy":
-            description = self._generate_trendy_description(product_data, size, condition, price)
-        elif style == "professional":
-            description = self._generate_professional_description(product_data, size, condition, price)
-        else:
-            description = self._generate_friendly_description(product_data, size, condition, price)
-        
-        return {"title": title, "description": description}
-    
-    def _generate_friendly_description(
-        self, product_data: ProductData, size: str, condition: str, price: float
-    ) -> str:
-        """Template descrizione amichevole"""
-        
-        return f"""Ciao! Vendo questo bellissimo {product_data.type.value.lower()} {product_data.brand} 😊
-
-📏 Taglia: {size}
-🎨 Colore: {product_data.color}
-🧵 Materiale: {product_data.material}
-✨ Condizione: {condition}
-
-Il capo è stato curato con amore e si presenta in ottime condizioni! Perfetto per arricchire il tuo guardaroba con un tocco di stile.
-
-💰 Prezzo: {price}€ (trattabile per acquisti multipli!)
-📦 Spedizione veloce e imballaggio accurato
-💬 Contattami pure per foto aggiuntive o qualsiasi domanda!
-
-#vinted #abbigliamento #secondamano #sostenibile #{product_data.brand.lower()} #{product_data.type.value.replace('-', '')}"""
-    
-    def _generate_professional_description(
-        self, product_data: ProductData, size: str, condition: str, price: float
-    ) -> str:
-        """Template descrizione professionale"""
+        title = next((t for t in titles if len(t) <= 60), titles[0][:60])
         
-        return f"""In vendita {product_data.type.value.lower()} {product_data.brand} in {condition.lower()}.
-
-DETTAGLI PRODOTTO:
-• Marca: {product_data.brand}
-• Tipo: {product_data.type.value}
-• Taglia: {size}
-• Colore: {product_data.color}
-• Materiale: {product_data.material}
-• Condizione: {condition}
-
-Il capo è stato conservato con cura e non presenta difetti evidenti. Ideale per chi cerca qualità a prezzo conveniente.
-
-CONDIZIONI DI VENDITA:
-• Prezzo: {price}€
-• Spedizione: disponibile con tracking
-• Pagamento: solo tramite piattaforma Vinted
-• Restituzione: secondo policy Vinted
-
-Per ulteriori informazioni o foto aggiuntive, non esitate a contattarmi.
-
-#abbigliamento #preloved #{product_data.brand.lower()}"""
-    
-    def _generate_trendy_description(
-        self, product_data: ProductData, size: str, condition: str, price: float
-    ) -> str:
-        """Template descrizione trendy"""
+        # Template descrizione basato su stile (default: friendly)
+        template = _DESCRIPTION_TEMPLATES.get(style, _FRIENDLY_DESCRIPTION)
         
-        return f"""🔥 SUPER FIND 🔥
-
-{product_data.type.value.title()} {product_data.brand} che non può mancare nel tuo closet! 💅
-
-✨ SPECS:
-📐 Size: {size}
-🌈 Color: {product_data.color}
-🔗 Material: {product_data.material}
-💯 Condition: {condition}
-
-Questo piece è davvero special e ti darà quel look che stavi cercando! Perfect per ogni occasion 🌟
-
-💸 Price: {price}€ 
-📲 DM me per più info!
-🚚 Fast shipping guaranteed
-
-#vintedfinds #thrifted #sustainable #fashion #{product_data.brand.lower()} #ootd #preloved"""
+        return {"title": title, "description": template.format_map(values)}
     
     def _validate_and_clean_content(self, content: Dict[str, str]) -> Dict[str, str]:
         """Valida e pulisce contenuto generato"""
@@ -3,16 +3,39 @@
 # Analisi statistiche dei prezzi
 # ============================================================================
 
-import statistics
+import math
+from collections import Counter
+from types import MappingProxyType
 from typing import List, Dict
 from ..models.price import VintedListing, PriceDistribution, PriceAnalysis
-from ..config.settings import Settings
+from ..config.settings import get_settings
+
+# Aggiustamento per velocità vendita desiderata
+SPEED_MULTIPLIERS = MappingProxyType({
+    "fast": 0.85,      # Prezzo aggressivo per vendita rapida
+    "normal": 1.0,     # Prezzo di mercato
+    "premium": 1.15    # Prezzo premium per massimizzare profitto
+})
+
+# Posizione di mercato -> testo del summary
+POSITION_TEXT = MappingProxyType({
+    "low": "competitivo",
+    "average": "allineato al mercato",
+    "high": "premium"
+})
 
 class PriceAnalyzer:
     """Analizza prezzi e suggerisce pricing ottimale"""
     
     def __init__(self):
-        self.settings = Settings()
+        self.settings = get_settings()
+        
+        # Moltiplicatori condizione × velocità precalcolati: una sola lookup per prezzo
+        self._combined_multipliers = {
+            (condition, speed): condition_multiplier * speed_multiplier
+            for condition, condition_multiplier in self.settings.CONDITION_MULTIPLIERS.items()
+            for speed, speed_multiplier in SPEED_MULTIPLIERS.items()
+        }
     
     def analyze_prices(
         self, 
@@ -25,14 +48,12 @@ class PriceAnalyzer:
         if not listings:
             return self._create_fallback_analysis()
         
-        # Filtra solo listings venduti con prezzo valido
-        valid_listings = [l for l in listings if l.sold and l.price > 0]
+        # Prezzi dei soli listings venduti con prezzo valido (un solo passaggio)
+        prices = [l.price for l in listings if l.sold and l.price > 0]
         
-        if not valid_listings:
+        if not prices:
             return self._create_fallback_analysis()
         
-        prices = [listing.price for listing in valid_listings]
-        
         # Calcola distribuzione
         distribution = self._calculate_distribution(prices)
         
@@ -46,15 +67,15 @@ class PriceAnalyzer:
         
         # Genera analisi testuale
         analysis_summary = self._generate_analysis_summary(
-            distribution, len(valid_listings), market_position
+            distribution, len(prices), market_position
         )
         
         return PriceAnalysis(
             suggested_price=suggested_price,
             distribution=distribution,
-            total_listings=len(valid_listings),
+            total_listings=len(prices),
             price_range=f"{distribution.min_price}€ - {distribution.max_price}€",
-            confidence_level=self._calculate_confidence(len(valid_listings)),
+            confidence_level=self._calculate_confidence(len(prices)),
             market_position=market_position,
             analysis_summary=analysis_summary
         )
@@ -62,19 +83,28 @@ class PriceAnalyzer:
     def _calculate_distribution(self, prices: List[float]) -> PriceDistribution:
         """Calcola distribuzione statistica dei prezzi"""
         
+        # Un solo ordinamento: min, max, mediana e quartili letti per indice
         sorted_prices = sorted(prices)
+        n = len(sorted_prices)
+        mid = n // 2
+        median = sorted_prices[mid] if n % 2 else (sorted_prices[mid - 1] + sorted_prices[mid]) / 2
+        
+        mean = math.fsum(sorted_prices) / n
+        std_dev = math.sqrt(math.fsum((p - mean) ** 2 for p in sorted_prices) / (n - 1)) if n > 1 else 0
+        
+        mode, mode_count = Counter(prices).most_common(1)[0]
         
         return PriceDistribution(
-            min_price=min(prices),
-            max_price=max(prices),
-            mean_price=round(statistics.mean(prices), 2),
-            median_price=statistics.median(prices),
-            mode_price=statistics.mode(prices) if len(set(prices)) < len(prices) else statistics.median(prices),
-            std_dev=round(statistics.stdev(prices) if len(prices) > 1 else 0, 2),
+            min_price=sorted_prices[0],
+            max_price=sorted_prices[-1],
+            mean_price=round(mean, 2),
+            median_price=median,
+            mode_price=mode if mode_count > 1 else median,
+            std_dev=round(std_dev, 2),
             quartiles={
-                "Q1": sorted_prices[len(sorted_prices)//4],
-                "Q2": statistics.median(prices),
-                "Q3": sorted_prices[3*len(sorted_prices)//4]
+                "Q1": sorted_prices[n//4],
+                "Q2": median,
+                "Q3": sorted_prices[3*n//4]
             }
         )
     
@@ -89,18 +119,16 @@ class PriceAnalyzer:
         # Base price (mediana è più robusta della media)
         base_price = distribution.median_price
         
-        # Aggiustamento per condizione
-        condition_multiplier = self.settings.CONDITION_MULTIPLIERS.get(condition, 1.0)
-        
-        # Aggiustamento per velocità vendita desiderata
-        speed_multipliers = {
-            "fast": 0.85,      # Prezzo aggressivo per vendita rapida
-            "normal": 1.0,     # Prezzo di mercato
-            "premium": 1.15    # Prezzo premium per massimizzare profitto
-        }
-        speed_multiplier = speed_multipliers.get(target_sale_speed, 1.0)
+        # Aggiustamento per condizione e velocità vendita desiderata
+        multiplier = self._combined_multipliers.get((condition, target_sale_speed))
+        if multiplier is None:
+            # Condizione o velocità sconosciuta: il valore mancante vale 1.0
+            multiplier = (
+                self.settings.CONDITION_MULTIPLIERS.get(condition, 1.0) *
+                SPEED_MULTIPLIERS.get(target_sale_speed, 1.0)
+            )
         
-        suggested = base_price * condition_multiplier * speed_multiplier
+        suggested = base_price * multiplier
         
         # Arrotonda a numero sensato
         return max(1, round(suggested))
@@ -137,16 +165,10 @@ class PriceAnalyzer:
     ) -> str:
         """Genera summary testuale dell'analisi"""
         
-        position_text = {
-            "low": "competitivo",
-            "average": "allineato al mercato", 
-            "high": "premium"
-        }
-        
         return f"""
         Analizzati {sample_size} articoli simili venduti.
         Prezzo medio di mercato: {distribution.mean_price}€
-        Il prezzo suggerito è {position_text[market_position]}.
+        Il prezzo suggerito è {POSITION_TEXT[market_position]}.
         Variabilità prezzi: ±{distribution.std_dev}€
         """.strip()
     
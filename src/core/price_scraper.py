@@ -4,25 +4,121 @@
 # ============================================================================
 
 import asyncio
+import logging
+import math
 import aiohttp
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
+import orjson
+from functools import lru_cache
+from typing import List, Dict, Optional, Tuple
 from urllib.parse import urlencode
-import time
 import random
+from types import MappingProxyType
+
+# isa-l (opzionale, extra "speedups"): decompressione gzip/deflate SIMD, stessa API di zlib
+try:
+    from isal import isal_zlib as zlib
+except ImportError:
+    import zlib
 
 from ..models.price import VintedListing
-from ..config.settings import Settings
+from ..config.settings import get_settings
 from ..utils.text_utils import TextNormalizer
+from ..services.cache_service import CacheService
+from ..services.rate_limiter import TokenBucket
+from ..services.request_collapser import RequestCollapser
+
+logger = logging.getLogger(__name__)
+
+# Paginazione: pagine massime per ricerca, risultati massimi per pagina e richieste contemporanee verso Vinted
+MAX_PAGES = 5
+MAX_PER_PAGE = 96
+PAGE_CONCURRENCY = 3
+
+# Taglia -> ID Vinted
+SIZE_IDS = MappingProxyType({
+    "XS": "1", "S": "2", "M": "3", 
+    "L": "4", "XL": "5", "XXL": "6"
+})
+
+# Stato Vinted -> condizione in italiano
+CONDITION_NAMES = MappingProxyType({
+    "brand_new_with_tags": "Nuovo con etichetta",
+    "very_good": "Ottimo", 
+    "good": "Buono",
+    "satisfactory": "Discreto"
+})
+
+# Prezzi fittizi per tipo (fallback quando lo scraping fallisce); chiavi già minuscole
+MOCK_PRICES = MappingProxyType({
+    "felpa": (12, 15, 18, 20, 25, 30),
+    "t-shirt": (8, 10, 12, 15, 18),
+    "jeans": (20, 25, 30, 35, 40),
+    "scarpe": (25, 30, 40, 50, 60)
+})
+DEFAULT_MOCK_PRICES = (10, 15, 20, 25)
+
+# Risposte transitorie di Vinted per cui si ritenta la pagina con backoff esponenziale
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+def _retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Attesa prima del nuovo tentativo: Retry-After se numerico, altrimenti 0.5s, 1s, 2s... con jitter"""
+    
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), 30.0)
+    return 0.5 * 2 ** attempt + random.uniform(0, 0.25)
+
+@lru_cache(maxsize=1024)
+def _search_params(brand: str, item_type: str, size: str) -> Tuple[Tuple[str, str], ...]:
+    """Parametri di ricerca Vinted in cache: normalizzazione alias eseguita una volta per combinazione"""
+    
+    params = {
+        'search_text': f"{TextNormalizer.normalize_brand(brand)} {TextNormalizer.normalize_item_type(item_type)}",
+        'size_ids[]': SIZE_IDS.get(size.upper()),
+        'status_ids[]': '6',  # Solo venduti
+        'order': 'newest_first'
+    }
+    
+    return tuple((k, v) for k, v in params.items() if v)
+
+def _decompress_body(body: bytes, content_encoding: str) -> bytes:
+    """Decomprime il body gzip/deflate in una sola chiamata"""
+    
+    encoding = content_encoding.strip().lower()
+    
+    if encoding in ("gzip", "x-gzip"):
+        return zlib.decompress(body, zlib.MAX_WBITS | 16)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Alcuni server inviano deflate "raw" senza header zlib
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
 
 class VintedPriceScraper:
     """Scraper per prezzi Vinted con rate limiting e caching"""
     
     def __init__(self):
-        self.settings = Settings()
+        self.settings = get_settings()
         self.base_url = self.settings.VINTED_BASE_URL
-        self.session = None
+        self.max_retries = max(1, self.settings.VINTED_MAX_RETRIES)
         self.text_normalizer = TextNormalizer()
+        self.cache = CacheService(
+            ttl_hours=self.settings.VINTED_RESPONSE_CACHE_TTL / 3600,
+            stale_ttl_hours=self.settings.VINTED_RESPONSE_STALE_TTL / 3600
+        )
+        
+        # Ricerche concorrenti identiche (anche da autolister diversi) eseguono un solo scraping
+        self._search_collapser = RequestCollapser(self._search)
+        
+        # Aggiornamenti in background delle voci stale, uno per ricerca
+        self._refresh_tasks: Dict[tuple, asyncio.Task] = {}
+        
+        # Rate limit verso Vinted condiviso da tutte le ricerche di questo scraper
+        self.rate_limiter = TokenBucket(
+            rate=self.settings.VINTED_RATE_LIMIT,
+            period=self.settings.VINTED_RATE_PERIOD
+        )
         
         # Headers per evitare detection
         self.headers = {
@@ -32,145 +128,273 @@ class VintedPriceScraper:
             'Accept-Encoding': 'gzip, deflate',
             'Connection': 'keep-alive',
         }
+        
+        # Sessione HTTP condivisa (creata al primo uso): il pool riusa le connessioni keep-alive
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    async def __aenter__(self) -> "VintedPriceScraper":
+        await self._ensure_session()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+    
+    async def _ensure_session(self) -> aiohttp.ClientSession:
+        """Restituisce la sessione condivisa, creandola se assente o legata a un altro loop"""
+        
+        # Nessun await tra controllo e assegnazione: atomico sul loop, non serve un asyncio.Lock
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            # Decompressione fatta da noi in un'unica passata sul body completo
+            self._session = aiohttp.ClientSession(
+                headers=self.headers,
+                auto_decompress=False,
+                connector=aiohttp.TCPConnector(
+                    limit=20,
+                    limit_per_host=8,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60
+                )
+            )
+            self._session_loop = loop
+        return self._session
+    
+    async def aclose(self):
+        """Chiude la sessione HTTP condivisa"""
+        
+        for task in list(self._refresh_tasks.values()):
+            task.cancel()
+        self._refresh_tasks.clear()
+        
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
     
     async def search_similar_items(
         self, 
         brand: str, 
         item_type: str, 
         size: str,
-        max_results: int = 20
+        max_results: int = 20,
+        force_refresh: bool = False
     ) -> List[VintedListing]:
-        """Cerca articoli simili su Vinted"""
+        """Cerca articoli simili su Vinted (force_refresh ignora la cache e la aggiorna)"""
+        
+        if force_refresh:
+            # Dati freschi richiesti esplicitamente: niente raggruppamento
+            return await self._search(brand, item_type, size, max_results, force_refresh=True)
         
-        if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.headers)
+        key = (brand.lower(), item_type.lower(), size.upper(), max_results)
+        return await self._search_collapser.submit(key, brand, item_type, size, max_results)
+    
+    async def _search(
+        self,
+        brand: str,
+        item_type: str,
+        size: str,
+        max_results: int,
+        force_refresh: bool = False
+    ) -> List[VintedListing]:
+        """Ricerca effettiva: cache su file e Vinted, listings fittizi se lo scraping fallisce"""
         
         try:
             search_params = self._build_search_params(brand, item_type, size)
-            listings = await self._fetch_listings(search_params, max_results)
+            listings = await self._fetch_listings_cached(search_params, max_results, force_refresh)
             return self._process_listings(listings)
             
         except Exception as e:
-            print(f"Scraping error: {e}")
+            logger.warning("Scraping error, using mock listings: %s", e)
             return self._get_mock_listings(brand, item_type, size)
-        
-        finally:
-            if self.session:
-                await self.session.close()
-                self.session = None
     
     def _build_search_params(self, brand: str, item_type: str, size: str) -> Dict:
-        """Costruisce parametri di ricerca Vinted"""
+        """Costruisce parametri di ricerca Vinted (copia: il chiamante può modificarla)"""
+        return dict(_search_params(brand, item_type, size))
+    
+    async def _fetch_listings_cached(
+        self,
+        search_params: Dict,
+        max_results: int,
+        force_refresh: bool = False
+    ) -> List[Dict]:
+        """Fetch listings passando dalla cache su file (evita di consumare il rate limit)"""
         
-        # Normalizza parametri
-        normalized_brand = self.text_normalizer.normalize_brand(brand)
-        normalized_type = self.text_normalizer.normalize_item_type(item_type)
+        cache_key = {"vinted_search": search_params, "max_results": max_results}
         
-        params = {
-            'search_text': f"{normalized_brand} {normalized_type}",
-            'size_ids[]': self._get_size_id(size),
-            'status_ids[]': '6',  # Solo venduti
-            'order': 'newest_first'
-        }
+        if force_refresh:
+            return await self._refresh_listings(cache_key, search_params, max_results)
         
-        return {k: v for k, v in params.items() if v}
+        cached, stale = await asyncio.to_thread(self.cache.get_with_staleness, cache_key)
+        if cached is not None:
+            # Dato scaduto da poco: risposta immediata, aggiornamento fuori dal percorso della richiesta
+            if stale:
+                self._schedule_refresh(cache_key, search_params, max_results)
+            return cached["items"]
+        
+        return await self._refresh_listings(cache_key, search_params, max_results)
     
-    async def _fetch_listings(self, search_params: Dict, max_results: int) -> List[Dict]:
-        """Fetch listings da Vinted con pagination"""
+    async def _refresh_listings(self, cache_key: Dict, search_params: Dict, max_results: int) -> List[Dict]:
+        """Scarica i listings da Vinted e aggiorna la cache"""
         
-        all_listings = []
-        page = 1
+        session = await self._ensure_session()
+        listings = await self._fetch_listings(session, search_params, max_results)
         
-        while len(all_listings) < max_results and page <= 5:  # Max 5 pagine
-            
-            search_params['page'] = page
-            url = f"{self.base_url}/api/v2/catalog/items?" + urlencode(search_params, doseq=True)
-            
-            await self._rate_limit_delay()
+        # Ricerca senza risultati: TTL breve, così si riprova presto senza martellare Vinted
+        ttl_seconds = None if listings else self.settings.VINTED_EMPTY_RESPONSE_CACHE_TTL
+        await asyncio.to_thread(self.cache.set, cache_key, {"items": listings}, ttl_seconds)
+        return listings
+    
+    def _schedule_refresh(self, cache_key: Dict, search_params: Dict, max_results: int):
+        """Avvia (se non già in corso) l'aggiornamento in background di una ricerca stale"""
+        
+        refresh_key = (tuple(sorted(search_params.items())), max_results)
+        if refresh_key in self._refresh_tasks:
+            return
+        
+        async def refresh():
+            try:
+                await self._refresh_listings(cache_key, search_params, max_results)
+            except Exception as e:
+                logger.warning("Background refresh failed: %s", e)
+            finally:
+                self._refresh_tasks.pop(refresh_key, None)
+        
+        self._refresh_tasks[refresh_key] = asyncio.ensure_future(refresh())
+    
+    async def _fetch_listings(
+        self,
+        session: aiohttp.ClientSession,
+        search_params: Dict,
+        max_results: int
+    ) -> List[Dict]:
+        """Fetch listings da Vinted con pagination (solo le pagine necessarie, in parallelo dopo la prima)"""
+        
+        # Pagine grandi quanto i risultati richiesti: di solito basta una sola richiesta (e un solo token)
+        per_page = min(max_results, MAX_PER_PAGE)
+        search_params = {**search_params, 'per_page': per_page}
+        semaphore = asyncio.Semaphore(PAGE_CONCURRENCY)
+        
+        # Errore sulla prima pagina: l'eccezione arriva al chiamante
+        all_listings = await self._fetch_page(session, search_params, 1, semaphore) or []
+        
+        # Risultati sufficienti, o pagina incompleta (non ce ne sono altri)
+        if len(all_listings) >= max_results or len(all_listings) < per_page:
+            return all_listings[:max_results]
+        
+        pages = min(math.ceil((max_results - len(all_listings)) / per_page), MAX_PAGES - 1)
+        results = await asyncio.gather(
+            *(
+                self._fetch_page(session, search_params, page, semaphore)
+                for page in range(2, pages + 2)
+            ),
+            return_exceptions=True
+        )
+        
+        # Pagine in ordine fino alla prima vuota o fallita
+        for items in results:
+            if not items or isinstance(items, Exception):
+                break
+            all_listings.extend(items)
+            if len(all_listings) >= max_results:
+                break
+        
+        return all_listings[:max_results]
+    
+    async def _fetch_page(
+        self,
+        session: aiohttp.ClientSession,
+        search_params: Dict,
+        page: int,
+        semaphore: asyncio.Semaphore
+    ) -> Optional[List[Dict]]:
+        """Fetch di una singola pagina (None se la risposta non è valida)"""
+        
+        url = f"{self.base_url}/api/v2/catalog/items?" + urlencode(
+            {**search_params, 'page': page}, doseq=True
+        )
+        
+        for attempt in range(self.max_retries):
+            last_attempt = attempt == self.max_retries - 1
+            retry_after = None
             
-            async with self.session.get(url) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    items = data.get('items', [])
-                    
-                    if not items:
-                        break
+            try:
+                async with semaphore, self.rate_limiter:
+                    async with session.get(url) as response:
+                        if response.status == 200:
+                            body = _decompress_body(
+                                await response.read(),
+                                response.headers.get('Content-Encoding', '')
+                            )
+                            data = orjson.loads(body)
+                            return data.get('items', [])
                         
-                    all_listings.extend(items)
-                    page += 1
-                else:
-                    break
+                        if response.status not in RETRY_STATUSES or last_attempt:
+                            return None
+                        retry_after = response.headers.get('Retry-After')
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+            
+            # Attesa fuori dal semaforo: le altre pagine proseguono nel frattempo
+            await asyncio.sleep(_retry_delay(attempt, retry_after))
         
-        return all_listings[:max_results]
+        return None
     
     def _process_listings(self, raw_listings: List[Dict]) -> List[VintedListing]:
         """Processa raw listings in VintedListing objects"""
         
-        processed = []
-        
-        for item in raw_listings:
-            try:
-                listing = VintedListing(
-                    title=item.get('title', ''),
-                    price=float(item.get('price', {}).get('amount', 0)),
-                    condition=self._normalize_condition(item.get('status', '')),
-                    url=f"{self.base_url}/items/{item.get('id')}",
-                    brand=item.get('brand', {}).get('title', ''),
-                    size=item.get('size_title', ''),
-                    sold=item.get('is_sold', False)
-                )
-                processed.append(listing)
-                
-            except (ValueError, KeyError) as e:
-                continue  # Skip invalid listings
+        return [
+            listing for listing in map(self._build_listing, raw_listings)
+            if listing is not None
+        ]
+    
+    def _build_listing(self, item: Dict) -> Optional[VintedListing]:
+        """Converte un singolo item Vinted (None se non valido)"""
         
-        return processed
+        try:
+            return VintedListing(
+                title=item.get('title', ''),
+                price=float((item.get('price') or {}).get('amount', 0)),
+                condition=self._normalize_condition(item.get('status', '')),
+                url=f"{self.base_url}/items/{item.get('id')}",
+                brand=(item.get('brand') or {}).get('title', ''),
+                size=item.get('size_title', ''),
+                sold=item.get('is_sold', False)
+            )
+        except (ValueError, KeyError, TypeError):
+            return None  # Skip invalid listings
     
     def _get_mock_listings(self, brand: str, item_type: str, size: str) -> List[VintedListing]:
         """Genera listings fittizi per testing/fallback"""
         
-        # Mock prices basato su tipo
-        mock_prices = {
-            "felpa": [12, 15, 18, 20, 25, 30],
-            "t-shirt": [8, 10, 12, 15, 18],
-            "jeans": [20, 25, 30, 35, 40],
-            "scarpe": [25, 30, 40, 50, 60]
-        }
+        # Mock prices basato su tipo (una sola lookup)
+        prices = MOCK_PRICES.get(item_type.lower(), DEFAULT_MOCK_PRICES)
         
-        prices = mock_prices.get(item_type.lower(), [10, 15, 20, 25])
+        # Casualità estratta in blocco (ID distinti, variazioni, condizioni), poi una sola comprehension
+        count = len(prices)
+        item_ids = random.sample(range(1000000, 10000000), count)
+        variations = random.choices(range(-3, 4), k=count)  # Variazione casuale
+        conditions = random.choices(("Ottimo", "Buono", "Discreto"), k=count)
+        title = f"{brand} {item_type} - Taglia {size}"
         
-        listings = []
-        for i, price in enumerate(prices):
-            listings.append(VintedListing(
-                title=f"{brand} {item_type} - Taglia {size}",
-                price=price + random.randint(-3, 3),  # Variazione casuale
-                condition=random.choice(["Ottimo", "Buono", "Discreto"]),
-                url=f"https://vinted.it/item/{random.randint(1000000, 9999999)}",
+        return [
+            VintedListing(
+                title=title,
+                price=price + variation,
+                condition=condition,
+                url=f"https://vinted.it/item/{item_id}",
                 brand=brand,
                 size=size,
                 sold=True
-            ))
-        
-        return listings
+            )
+            for price, variation, condition, item_id in zip(prices, variations, conditions, item_ids)
+        ]
     
     def _get_size_id(self, size: str) -> Optional[str]:
         """Converte taglia in ID Vinted"""
-        size_mapping = {
-            "XS": "1", "S": "2", "M": "3", 
-            "L": "4", "XL": "5", "XXL": "6"
-        }
-        return size_mapping.get(size.upper())
+        return SIZE_IDS.get(size.upper())
     
     def _normalize_condition(self, condition: str) -> str:
         """Normalizza condizione Vinted"""
-        condition_mapping = {
-            "brand_new_with_tags": "Nuovo con etichetta",
-            "very_good": "Ottimo", 
-            "good": "Buono",
-            "satisfactory": "Discreto"
-        }
-        return condition_mapping.get(condition, "Buono")
-    
-    async def _rate_limit_delay(self):
-        """Delay per rispettare rate limits"""
-        await asyncio.sleep(random.uniform(1.0, 2.5))
\ No newline at end of file
+        return CONDITION_NAMES.get(condition, "Buono")
@@ -3,17 +3,79 @@
 # Analisi immagini con OpenAI Vision
 # ============================================================================
 
-import json
-import re
-from typing import Optional
+import asyncio
+import orjson
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from types import MappingProxyType
+from typing import Dict, List, Optional, Sequence, Tuple
 from PIL import Image
 import io
-import base64
+
+# pybase64 (opzionale, extra "speedups"): encoder base64 SIMD che produce direttamente str
+try:
+    from pybase64 import b64encode_as_string
+except ImportError:
+    import base64
+    
+    def b64encode_as_string(data: bytes) -> str:
+        """Fallback stdlib: encode + decode ASCII"""
+        return base64.b64encode(data).decode('ascii')
 
 from ..models.product import ProductData, ProductType
 from ..services.openai_service import OpenAIService
+from ..services.cache_service import CacheService
 from ..utils.image_utils import ImageProcessor
-from ..config.settings import Settings
+from ..utils.text_utils import extract_json_object
+from ..config.settings import get_settings
+
+# Prompt di analisi prodotto (costante: non ricostruito a ogni immagine)
+_ANALYSIS_PROMPT = """
+        Analizza questa immagine di un capo di abbigliamento.
+        
+        Restituisci SOLO un JSON valido con questi campi:
+        {
+          "brand": "nome del brand se visibile, altrimenti 'Sconosciuto'",
+          "type": "tipo specifico (felpa, t-shirt, jeans, scarpe, giacca, camicia)",
+          "color": "colore principale",
+          "material": "materiale principale se identificabile",
+          "category": "categoria Vinted appropriata",
+          "confidence_score": "score 0-1 sulla sicurezza dell'analisi",
+          "additional_features": {
+            "pattern": "descrizione pattern/stampe se presenti",
+            "style": "stile (casual, elegante, sportivo, etc)",
+            "season": "stagione appropriata"
+          }
+        }
+        
+        Sii preciso e usa termini italiani standard.
+        """
+
+# Tipi restituiti dal modello -> enum (costante: non ricostruita a ogni analisi)
+_TYPE_MAPPING = MappingProxyType({
+    'felpa': ProductType.FELPA,
+    'hoodie': ProductType.FELPA,
+    't-shirt': ProductType.T_SHIRT,
+    'maglietta': ProductType.T_SHIRT,
+    'jeans': ProductType.JEANS,
+    'scarpe': ProductType.SCARPE,
+    'giacca': ProductType.GIACCA,
+    'camicia': ProductType.CAMICIA
+})
+
+# Premessa al prompt quando si inviano più foto dello stesso capo
+_MULTI_IMAGE_PROMPT = """
+        Ci sono {count} immagini dello stesso capo (es. fronte, retro, etichetta):
+        fondi le informazioni in un singolo JSON.
+        """
+
+# Pool condiviso per il preprocessing di più immagini (lavoro CPU-bound in C)
+_PREPROCESS_POOL = ThreadPoolExecutor(
+    max_workers=os.cpu_count() or 4,
+    thread_name_prefix="image-preprocess"
+)
 
 class VisionAnalyzer:
     """Analizza immagini di abbigliamento usando GPT-4 Vision"""
@@ -21,126 +83,189 @@ class VisionAnalyzer:
     def __init__(self, api_key: Optional[str] = None):
         self.openai_service = OpenAIService(api_key)
         self.image_processor = ImageProcessor()
-        self.settings = Settings()
+        self.settings = get_settings()
+        self.cache = CacheService(ttl_hours=self.settings.VISION_CACHE_TTL_DAYS * 24)
+        self._memo: Dict[str, ProductData] = {}
     
     def analyze_image(self, image_data: bytes) -> ProductData:
-        """Analizza immagine e ritorna dati strutturati del prodotto"""
+        """Analizza immagine e ritorna dati strutturati del prodotto (sincrono, per chi non ha un event loop)"""
+        
+        async def analyze() -> ProductData:
+            try:
+                return await self.analyze_images_async([image_data])
+            finally:
+                # La sessione HTTP è legata al loop temporaneo di asyncio.run
+                await self.openai_service.aclose()
+        
+        return asyncio.run(analyze())
+    
+    async def analyze_image_async(self, image_data: bytes) -> ProductData:
+        """Come analyze_image, ma la chiamata Vision non occupa un thread durante l'attesa"""
+        return await self.analyze_images_async([image_data])
+    
+    async def analyze_images_async(self, images: Sequence[bytes]) -> ProductData:
+        """Analizza una o più foto dello stesso capo con una sola chiamata Vision"""
+        
+        # Immagini già analizzate (stesso contenuto): nessuna chiamata API
+        images_hash = self._images_hash(images)
+        product_data = await self._get_cached_product(images_hash)
+        if product_data is not None:
+            return product_data
         
-        # Preprocessing immagine
-        processed_image = self._preprocess_image(image_data)
+        # Senza chiave la chiamata fallirebbe comunque: nessun preprocessing inutile
+        self._require_api_key()
         
-        # Chiamata Vision API
-        analysis_result = self._call_vision_api(processed_image)
+        # Preprocessing (Pillow, CPU-bound) in un thread, chiamata API sull'event loop
+        processed_images = await asyncio.to_thread(self.preprocess_images, images)
+        analysis_result = await self._call_vision_api(processed_images)
         
         # Parsing e validazione risultato
-        product_data = self._parse_vision_result(analysis_result)
+        try:
+            product_data = self._parse_vision_result(analysis_result)
+        except (orjson.JSONDecodeError, KeyError, ValueError):
+            # Fallback con dati di base (non salvato in cache)
+            return self._create_fallback_product_data()
         
+        await self._cache_product(images_hash, product_data)
         return product_data
     
-    def _preprocess_image(self, image_data: bytes) -> bytes:
-        """Preprocessa immagine per ottimizzare analisi"""
+    def _require_api_key(self):
+        """Errore immediato se manca la chiave OpenAI"""
+        
+        if not self.openai_service.enabled:
+            raise VisionAnalysisError("OpenAI API key not configured: image analysis unavailable")
+    
+    def _images_hash(self, images: Sequence[bytes]) -> str:
+        """Hash del contenuto: per una sola immagine coincide con quello dei suoi bytes"""
+        
+        if not images:
+            raise VisionAnalysisError("No images to analyze")
+        if len(images) == 1:
+            return hashlib.blake2b(images[0], digest_size=16).hexdigest()
+        
+        digest = hashlib.blake2b(digest_size=16)
+        for image_data in images:
+            digest.update(hashlib.blake2b(image_data, digest_size=16).digest())
+        return digest.hexdigest()
+    
+    def _preprocess_image(self, image_data: bytes) -> Tuple[bytes, str]:
+        """Preprocessa immagine per ottimizzare analisi (ritorna bytes e MIME type)"""
         image = Image.open(io.BytesIO(image_data))
+        max_size = self.settings.MAX_IMAGE_SIZE
         
         # Resize se troppo grande
-        if image.width > 1024 or image.height > 1024:
+        if image.width > max_size or image.height > max_size:
+            # JPEG: decodifica già ridotta (scala DCT 1/2, 1/4, 1/8) senza scendere sotto max_size
+            image.draft('RGB', (max_size, max_size))
             image = self.image_processor.resize_maintain_aspect(
-                image, max_size=1024
+                image, max_size=max_size
             )
         
+        # RGB: niente canale alpha/palette nel payload (e JPEG non li supporta)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        
         # Ottimizzazione qualità
         image = self.image_processor.enhance_quality(image)
         
-        # Converti a bytes
+        # Converti a bytes: WebP è più compatto di JPEG a parità di qualità
         buffer = io.BytesIO()
-        image.save(buffer, format='JPEG', quality=85)
-        return buffer.getvalue()
+        try:
+            image.save(buffer, format='WEBP', quality=self.settings.IMAGE_QUALITY, method=4)
+            return buffer.getvalue(), 'image/webp'
+        except (OSError, KeyError):
+            # Pillow compilato senza supporto WebP
+            buffer = io.BytesIO()
+            image.save(buffer, format='JPEG', quality=self.settings.IMAGE_QUALITY, optimize=True)
+            return buffer.getvalue(), 'image/jpeg'
     
-    def _call_vision_api(self, image_data: bytes) -> dict:
-        """Chiama OpenAI Vision API"""
-        
-        base64_image = base64.b64encode(image_data).decode('utf-8')
+    def preprocess_images(self, images: Sequence[bytes]) -> List[Tuple[bytes, str]]:
+        """Preprocessa più immagini in parallelo (decode/resize/encode di Pillow rilasciano il GIL)"""
         
-        prompt = self._get_analysis_prompt()
+        if len(images) <= 1:
+            return [self._preprocess_image(image_data) for image_data in images]
+        return list(_PREPROCESS_POOL.map(self._preprocess_image, images))
+    
+    async def _call_vision_api(self, images: Sequence[Tuple[bytes, str]]) -> dict:
+        """Chiama OpenAI Vision API con una o più immagini (bytes, MIME type)"""
         
         try:
-            response = self.openai_service.vision_analyze(
-                image_base64=base64_image,
-                prompt=prompt,
-                max_tokens=self.settings.VISION_MAX_TOKENS
-            )
-            return response
-            
+            return await self.openai_service.avision_analyze_images(**self._build_vision_request(images))
         except Exception as e:
             raise VisionAnalysisError(f"Vision API error: {str(e)}")
     
-    def _get_analysis_prompt(self) -> str:
-        """Genera prompt ottimizzato per analisi prodotto"""
-        return """
-        Analizza questa immagine di un capo di abbigliamento.
+    def _build_vision_request(self, images: Sequence[Tuple[bytes, str]]) -> dict:
+        """Argomenti della chiamata Vision (immagini in base64)"""
         
-        Restituisci SOLO un JSON valido con questi campi:
-        {
-          "brand": "nome del brand se visibile, altrimenti 'Sconosciuto'",
-          "type": "tipo specifico (felpa, t-shirt, jeans, scarpe, giacca, camicia)",
-          "color": "colore principale",
-          "material": "materiale principale se identificabile",
-          "category": "categoria Vinted appropriata",
-          "confidence_score": "score 0-1 sulla sicurezza dell'analisi",
-          "additional_features": {
-            "pattern": "descrizione pattern/stampe se presenti",
-            "style": "stile (casual, elegante, sportivo, etc)",
-            "season": "stagione appropriata"
-          }
+        return {
+            "images": [
+                (b64encode_as_string(image_data), mime_type)
+                for image_data, mime_type in images
+            ],
+            "prompt": self._get_analysis_prompt(len(images)),
+            "max_tokens": self.settings.VISION_MAX_TOKENS,
+            "detail": self.settings.VISION_IMAGE_DETAIL
         }
+    
+    def _get_analysis_prompt(self, image_count: int = 1) -> str:
+        """Genera prompt ottimizzato per analisi prodotto"""
         
-        Sii preciso e usa termini italiani standard.
-        """
+        if image_count > 1:
+            return _MULTI_IMAGE_PROMPT.format(count=image_count) + _ANALYSIS_PROMPT
+        return _ANALYSIS_PROMPT
     
     def _parse_vision_result(self, api_response: dict) -> ProductData:
         """Parsa e valida risultato Vision API"""
         
-        try:
-            content = api_response['choices'][0]['message']['content']
-            
-            # Estrai JSON dalla risposta
-            json_match = re.search(r'\{.*\}', content, re.DOTALL)
-            if not json_match:
-                raise ValueError("No JSON found in response")
-            
-            data = json.loads(json_match.group())
-            
-            # Validazione e conversione
-            product_type = self._normalize_product_type(data.get('type', 'abbigliamento'))
-            
-            return ProductData(
-                brand=data.get('brand', 'Sconosciuto'),
-                type=product_type,
-                color=data.get('color', 'Vario'),
-                material=data.get('material', 'Misto'),
-                category=data.get('category', 'Abbigliamento'),
-                confidence_score=float(data.get('confidence_score', 0.5)),
-                additional_features=data.get('additional_features', {})
-            )
-            
-        except (json.JSONDecodeError, KeyError, ValueError) as e:
-            # Fallback con dati di base
-            return self._create_fallback_product_data()
+        content = api_response['choices'][0]['message']['content']
+        
+        # Estrai JSON dalla risposta
+        data = extract_json_object(content)
+        
+        # Validazione e conversione
+        product_type = self._normalize_product_type(data.get('type', 'abbigliamento'))
+        
+        return ProductData(
+            brand=data.get('brand', 'Sconosciuto'),
+            type=product_type,
+            color=data.get('color', 'Vario'),
+            material=data.get('material', 'Misto'),
+            category=data.get('category', 'Abbigliamento'),
+            confidence_score=float(data.get('confidence_score', 0.5)),
+            additional_features=data.get('additional_features', {})
+        )
+    
+    async def _get_cached_product(self, image_hash: str) -> Optional[ProductData]:
+        """Cerca il risultato prima in memoria, poi nella cache su file (SQLite in un thread)"""
+        
+        product_data = self._memo.get(image_hash)
+        if product_data is not None:
+            return product_data
+        
+        cached = await asyncio.to_thread(self.cache.get, {"vision": image_hash})
+        if cached is None:
+            return None
+        
+        product_data = ProductData(**{**cached, "type": ProductType(cached["type"])})
+        self._remember(image_hash, product_data)
+        return product_data
+    
+    async def _cache_product(self, image_hash: str, product_data: ProductData):
+        """Salva il risultato in memoria e nella cache su file"""
+        
+        self._remember(image_hash, product_data)
+        await asyncio.to_thread(self.cache.set, {"vision": image_hash}, asdict(product_data))
+    
+    def _remember(self, image_hash: str, product_data: ProductData):
+        """Memo in-process limitato: elimina la voce più vecchia oltre il limite"""
+        
+        if len(self._memo) >= self.settings.VISION_MEMO_MAX_ENTRIES:
+            del self._memo[next(iter(self._memo))]
+        self._memo[image_hash] = product_data
     
     def _normalize_product_type(self, type_str: str) -> ProductType:
         """Normalizza tipo prodotto a enum"""
-        type_mapping = {
-            'felpa': ProductType.FELPA,
-            'hoodie': ProductType.FELPA,
-            't-shirt': ProductType.T_SHIRT,
-            'maglietta': ProductType.T_SHIRT,
-            'jeans': ProductType.JEANS,
-            'scarpe': ProductType.SCARPE,
-            'giacca': ProductType.GIACCA,
-            'camicia': ProductType.CAMICIA
-        }
-        
-        normalized = type_str.lower().strip()
-        return type_mapping.get(normalized, ProductType.T_SHIRT)
+        return _TYPE_MAPPING.get(type_str.lower().strip(), ProductType.T_SHIRT)
     
     def _create_fallback_product_data(self) -> ProductData:
         """Crea dati fallback se Vision API fallisce"""
@@ -0,0 +1,9 @@
+# ============================================================================
+# FILE: src/models/_compat.py
+# Compatibilità dataclass tra versioni di Python
+# ============================================================================
+
+import sys
+
+# slots=True (Python >= 3.10): niente __dict__ per istanza, meno memoria e accesso attributi più rapido
+DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
@@ -7,8 +7,9 @@ from dataclasses import dataclass
 from typing import List
 from .product import ProductData, Condition
 from .price import PriceAnalysis  
+from ._compat import DATACLASS_SLOTS
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class ListingData:
     """Dati del listing finale"""
     title: str
@@ -26,7 +27,7 @@ class ListingData:
         if self.tags is None:
             self.tags = []
 
-@dataclass 
+@dataclass(**DATACLASS_SLOTS)
 class ListingResult:
     """Risultato completo del processo"""
     listing: ListingData
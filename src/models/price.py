@@ -6,8 +6,9 @@
 from dataclasses import dataclass
 from typing import List, Dict, Optional
 from datetime import datetime
+from ._compat import DATACLASS_SLOTS
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class VintedListing:
     """Singolo listing trovato su Vinted"""
     title: str
@@ -19,7 +20,7 @@ class VintedListing:
     date_posted: Optional[datetime] = None  # Ora Optional è importato
     sold: bool = False
     
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class PriceDistribution:
     """Distribuzione prezzi per un tipo di prodotto"""
     min_price: float
@@ -30,7 +31,7 @@ class PriceDistribution:
     std_dev: float
     quartiles: Dict[str, float]  # Q1, Q2, Q3
 
-@dataclass
+@dataclass(**DATACLASS_SLOTS)
 class PriceAnalysis:
     """Analisi completa dei prezzi"""
     suggested_price: float
@@ -3,55 +3,101 @@
 # Gestione cache
 # ============================================================================
 
-import json
+import logging
+import orjson
+import sqlite3
+import threading
+import time
 from pathlib import Path
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple
 import hashlib
+from ..config.settings import get_settings
+
+logger = logging.getLogger(__name__)
 
 class CacheService:
     """Gestione cache locale per risultati API e scraping"""
     
-    def __init__(self, cache_dir: str = "cache", ttl_hours: int = 24):
-        self.cache_dir = Path(cache_dir)
-        self.ttl = timedelta(hours=ttl_hours)
-        self.cache_dir.mkdir(exist_ok=True)
+    def __init__(self, cache_dir: Optional[str] = None, ttl_hours: int = 24, stale_ttl_hours: float = 0):
+        self.cache_dir = Path(cache_dir or get_settings().CACHE_DIR)
+        self.ttl_seconds = ttl_hours * 3600
+        # Finestra dopo il TTL in cui la voce resta leggibile come "stale" (stale-while-revalidate)
+        self.stale_seconds = stale_ttl_hours * 3600
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        
+        # Un solo database SQLite (WAL) al posto di un file per chiave;
+        # una connessione per thread (la cache è usata anche via asyncio.to_thread)
+        self.db_path = self.cache_dir / "cache.db"
+        self._local = threading.local()
+        
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+        conn.execute("DELETE FROM kv WHERE expires <= ?", (time.time(),))
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Connessione del thread corrente (creata al primo uso)"""
+        
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: autocommit, ogni statement è già atomico
+            conn = sqlite3.connect(self.db_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
     
     def _get_cache_key(self, data: Dict[str, Any]) -> str:
         """Genera chiave cache univoca"""
         
-        data_str = json.dumps(data, sort_keys=True)
-        return hashlib.md5(data_str.encode()).hexdigest()
-    
-    def _is_cache_valid(self, cache_file: Path) -> bool:
-        """Verifica se cache è ancora valida"""
-        
-        if not cache_file.exists():
-            return False
-            
-        mod_time = datetime.fromtimestamp(cache_file.stat().st_mtime)
-        return datetime.now() - mod_time < self.ttl
+        data_bytes = orjson.dumps(data, option=orjson.OPT_SORT_KEYS)
+        return hashlib.blake2b(data_bytes, digest_size=16).hexdigest()
     
     def get(self, key_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Recupera dati dalla cache"""
         
         cache_key = self._get_cache_key(key_data)
-        cache_file = self.cache_dir / f"{cache_key}.json"
-        
-        if self._is_cache_valid(cache_file):
-            try:
-                return json.loads(cache_file.read_text())
-            except (json.JSONDecodeError, IOError):
-                return None
-        return None
+        
+        try:
+            # 'expires' include la finestra stale: qui solo le voci ancora fresche
+            row = self._connect().execute(
+                "SELECT value FROM kv WHERE key = ? AND expires > ?",
+                (cache_key, time.time() + self.stale_seconds)
+            ).fetchone()
+            return orjson.loads(row[0]) if row else None
+        except (orjson.JSONDecodeError, sqlite3.Error):
+            return None
+    
+    def get_with_staleness(self, key_data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Recupera dati dalla cache anche se scaduti ma nella finestra stale; restituisce (dati, stale)"""
+        
+        cache_key = self._get_cache_key(key_data)
+        now = time.time()
+        
+        try:
+            row = self._connect().execute(
+                "SELECT value, expires FROM kv WHERE key = ? AND expires > ?",
+                (cache_key, now)
+            ).fetchone()
+            if not row:
+                return None, False
+            return orjson.loads(row[0]), row[1] - self.stale_seconds <= now
+        except (orjson.JSONDecodeError, sqlite3.Error):
+            return None, False
     
-    def set(self, key_data: Dict[str, Any], value: Dict[str, Any]):
-        """Salva dati in cache"""
+    def set(self, key_data: Dict[str, Any], value: Dict[str, Any], ttl_seconds: Optional[float] = None):
+        """Salva dati in cache (ttl_seconds sostituisce il TTL di default per questa voce)"""
         
         cache_key = self._get_cache_key(key_data)
-        cache_file = self.cache_dir / f"{cache_key}.json"
+        data = orjson.dumps(value)
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
         
         try:
-            cache_file.write_text(json.dumps(value))
-        except IOError as e:
-            print(f"Cache save failed: {str(e)}")
+            self._connect().execute(
+                "INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)",
+                (cache_key, data, time.time() + ttl + self.stale_seconds)
+            )
+        except sqlite3.Error as e:
+            logger.warning("Cache save failed: %s", e)
\ No newline at end of file
@@ -0,0 +1,75 @@
+# ============================================================================
+# FILE: src/services/job_queue.py
+# Coda di job asincroni con stato consultabile
+# ============================================================================
+
+import asyncio
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from .cache_service import CacheService
+
+class JobQueueFullError(Exception):
+    """Coda job piena"""
+    pass
+
+class JobQueue:
+    """Esegue job in background con un pool di worker e salva lo stato in cache"""
+    
+    def __init__(self, workers: int = 2, max_size: int = 100, ttl_hours: float = 1):
+        self.workers = workers
+        self.max_size = max_size
+        # Stato su file: visibile anche agli altri worker uvicorn
+        self.cache = CacheService(ttl_hours=ttl_hours)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+    
+    async def start(self):
+        """Avvia i worker sul loop corrente"""
+        
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+    
+    async def stop(self):
+        """Ferma i worker (i job ancora in coda vengono scartati)"""
+        
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+    
+    async def submit(self, job: Callable[[], Awaitable[Any]]) -> str:
+        """Accoda un job (il risultato deve essere serializzabile in JSON) e restituisce il suo id"""
+        
+        if self._queue is None:
+            raise RuntimeError("JobQueue non avviata")
+        
+        task_id = uuid.uuid4().hex
+        try:
+            self._queue.put_nowait((task_id, job))
+        except asyncio.QueueFull:
+            raise JobQueueFullError("Troppi job in coda, riprova più tardi")
+        
+        await self._set_status(task_id, "pending")
+        return task_id
+    
+    async def get_status(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """Restituisce stato ed eventuale risultato del job"""
+        return await asyncio.to_thread(self.cache.get, {"job": task_id})
+    
+    async def _set_status(self, task_id: str, status: str, **extra):
+        """Salva lo stato del job (SQLite in un thread: un lock sul file non blocca l'event loop)"""
+        await asyncio.to_thread(self.cache.set, {"job": task_id}, {"task_id": task_id, "status": status, **extra})
+    
+    async def _worker(self):
+        """Consuma job dalla coda fino alla cancellazione"""
+        
+        while True:
+            task_id, job = await self._queue.get()
+            try:
+                await self._set_status(task_id, "running")
+                result = await job()
+                await self._set_status(task_id, "done", result=result)
+            except Exception as e:
+                await self._set_status(task_id, "failed", error=str(e))
+            finally:
+                self._queue.task_done()
\ No newline at end of file
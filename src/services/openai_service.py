@@ -3,71 +3,175 @@
 # Wrapper per OpenAI API
 # ============================================================================
 
+import aiohttp
 import openai
-from typing import Optional, Dict, Any
+import random
+from typing import Optional, Dict, Any, AsyncIterator, Sequence, Tuple
 import asyncio
-from ..config.settings import Settings
+from ..config.settings import get_settings
+
+# Errori transitori per cui ha senso ritentare la chiamata
+_RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain
+)
+
+def _retry_delay(attempt: int) -> float:
+    """Backoff esponenziale con jitter (0.5s, 1s, 2s, ...)"""
+    return 0.5 * 2 ** attempt + random.uniform(0, 0.25)
 
 class OpenAIService:
     """Service per interazioni con OpenAI API"""
     
     def __init__(self, api_key: Optional[str] = None):
-        self.settings = Settings()
-        if api_key:
-            openai.api_key = api_key
-            self.enabled = True
-        else:
-            self.enabled = False
+        self.settings = get_settings()
+        # Chiave passata a ogni chiamata: più istanze con chiavi diverse convivono nello stesso processo
+        self.api_key = api_key
+        self.enabled = bool(api_key)
+        
+        # Sessione aiohttp condivisa: senza, l'SDK apre una connessione TLS nuova per ogni chiamata async
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def _ensure_session(self) -> aiohttp.ClientSession:
+        """Restituisce la sessione condivisa, creandola se assente o legata a un altro loop"""
+        
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=16,
+                    ttl_dns_cache=300,
+                    keepalive_timeout=60
+                )
+            )
+            self._session_loop = loop
+        return self._session
+    
+    async def aclose(self):
+        """Chiude la sessione HTTP condivisa"""
+        
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._session_loop = None
     
-    def vision_analyze(self, image_base64: str, prompt: str, max_tokens: int = 300) -> Dict[str, Any]:
+    async def avision_analyze(
+        self,
+        image_base64: str,
+        prompt: str,
+        max_tokens: int = 300,
+        mime_type: str = "image/jpeg",
+        detail: str = "auto"
+    ) -> Dict[str, Any]:
         """Analizza immagine con GPT-4 Vision"""
         
+        return await self.avision_analyze_images([(image_base64, mime_type)], prompt, max_tokens, detail)
+    
+    async def avision_analyze_images(
+        self,
+        images: Sequence[Tuple[str, str]],
+        prompt: str,
+        max_tokens: int = 300,
+        detail: str = "auto"
+    ) -> Dict[str, Any]:
+        """Analizza più immagini (base64, MIME type) in una sola richiesta Vision"""
+        
         if not self.enabled:
             raise OpenAIServiceError("OpenAI API key not configured")
         
         try:
-            response = openai.ChatCompletion.create(
-                model=self.settings.OPENAI_VISION_MODEL,
-                messages=[
-                    {
-                        "role": "user",
-                        "content": [
-                            {"type": "text", "text": prompt},
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": f"data:image/jpeg;base64,{image_base64}"}
-                            }
-                        ]
-                    }
-                ],
-                max_tokens=max_tokens,
-                temperature=0.1
-            )
-            
-            return response
-            
+            return await self._acreate(self._vision_request(images, prompt, max_tokens, detail))
         except Exception as e:
             raise OpenAIServiceError(f"Vision API call failed: {str(e)}")
     
-    def text_completion(self, prompt: str, max_tokens: int = 500, temperature: float = 0.7) -> Dict[str, Any]:
+    async def atext_completion(self, prompt: str, max_tokens: int = 500, temperature: float = 0.7) -> Dict[str, Any]:
         """Genera testo con GPT-4"""
         
         if not self.enabled:
             raise OpenAIServiceError("OpenAI API key not configured")
         
         try:
-            response = openai.ChatCompletion.create(
-                model=self.settings.OPENAI_TEXT_MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=max_tokens,
-                temperature=temperature
-            )
-            
-            return response
-            
+            return await self._acreate(self._text_request(prompt, max_tokens, temperature))
+        except Exception as e:
+            raise OpenAIServiceError(f"Text completion failed: {str(e)}")
+    
+    async def atext_completion_stream(
+        self,
+        prompt: str,
+        max_tokens: int = 500,
+        temperature: float = 0.7
+    ) -> AsyncIterator[str]:
+        """Genera testo con GPT-4 in streaming: restituisce i frammenti man mano che arrivano"""
+        
+        if not self.enabled:
+            raise OpenAIServiceError("OpenAI API key not configured")
+        
+        try:
+            # Il retry copre solo l'apertura dello stream, non i frammenti già ricevuti
+            response = await self._acreate({**self._text_request(prompt, max_tokens, temperature), "stream": True})
+            async for chunk in response:
+                delta = chunk["choices"][0]["delta"].get("content")
+                if delta:
+                    yield delta
         except Exception as e:
             raise OpenAIServiceError(f"Text completion failed: {str(e)}")
+    
+    def _vision_request(
+        self,
+        images: Sequence[Tuple[str, str]],
+        prompt: str,
+        max_tokens: int,
+        detail: str
+    ) -> Dict[str, Any]:
+        """Parametri della richiesta Vision: il prompt seguito da un blocco per immagine"""
+        
+        content = [{"type": "text", "text": prompt}]
+        content.extend(
+            {
+                "type": "image_url",
+                "image_url": {
+                    "url": f"data:{mime_type};base64,{image_base64}",
+                    "detail": detail
+                }
+            }
+            for image_base64, mime_type in images
+        )
+        
+        return {
+            "model": self.settings.OPENAI_VISION_MODEL,
+            "messages": [{"role": "user", "content": content}],
+            "max_tokens": max_tokens,
+            "temperature": 0.1
+        }
+    
+    def _text_request(self, prompt: str, max_tokens: int, temperature: float) -> Dict[str, Any]:
+        """Parametri della richiesta di testo"""
+        
+        return {
+            "model": self.settings.OPENAI_TEXT_MODEL,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": max_tokens,
+            "temperature": temperature
+        }
+    
+    async def _acreate(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """ChatCompletion asincrona con retry e backoff esponenziale sugli errori transitori"""
+        
+        # aiosession è una ContextVar: vale solo per il task corrente
+        openai.aiosession.set(self._ensure_session())
+        
+        for attempt in range(self.settings.OPENAI_MAX_RETRIES):
+            try:
+                return await openai.ChatCompletion.acreate(api_key=self.api_key, **request)
+            except _RETRYABLE_ERRORS:
+                if attempt == self.settings.OPENAI_MAX_RETRIES - 1:
+                    raise
+                await asyncio.sleep(_retry_delay(attempt))
 
 class OpenAIServiceError(Exception):
     """Errore OpenAI Service"""
-    pass
\ No newline at end of file
+    pass
@@ -0,0 +1,36 @@
+# ============================================================================
+# FILE: src/services/rate_limiter.py
+# Rate limiting a token bucket
+# ============================================================================
+
+import asyncio
+import time
+from typing import Optional
+
+class TokenBucket:
+    """Token bucket asincrono: consente burst fino a 'capacity' e poi 'rate' richieste per 'period' secondi"""
+    
+    def __init__(self, rate: float, period: float = 1.0, capacity: Optional[float] = None):
+        self.rate = rate / period
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+    
+    async def acquire(self):
+        """Consuma un token, attendendo solo se il bucket è vuoto"""
+        
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        
+        # Il token viene prenotato subito: i chiamanti successivi attendono in coda
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+    
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
\ No newline at end of file
@@ -0,0 +1,32 @@
+# ============================================================================
+# FILE: src/services/request_collapser.py
+# Collasso richieste concorrenti identiche
+# ============================================================================
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+class RequestCollapser:
+    """Richieste identiche concorrenti condividono un solo loader in corso per chiave"""
+    
+    def __init__(self, loader: Callable[..., Awaitable[Any]]):
+        self.loader = loader
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+    
+    async def submit(self, key: Hashable, *args) -> Any:
+        """Avvia il loader per la chiave, o si aggancia a quello già in corso, e ne attende il risultato"""
+        
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self.loader(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._release(key, done))
+        
+        # shield: un richiedente annullato non annulla il loader condiviso dagli altri
+        return await asyncio.shield(task)
+    
+    def _release(self, key: Hashable, task: asyncio.Task):
+        """Rimuove il loader terminato: la richiesta successiva per la chiave ne avvia uno nuovo"""
+        
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
@@ -7,7 +7,7 @@ import asyncio
 import aiohttp
 from typing import Optional, Dict, Any
 from fake_useragent import UserAgent
-from bs4 import BeautifulSoup
+from selectolax.parser import HTMLParser
 from utils.text_utils import TextNormalizer
 from services.cache_service import CacheService
 
@@ -28,7 +28,7 @@ class ScrapingService:
         """Fetch pagina web con caching"""
         
         cache_key = {"url": url, "params": params}
-        cached = self.cache.get(cache_key)
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
         if cached:
             return cached.get("content")
         
@@ -45,7 +45,7 @@ class ScrapingService:
                 async with session.get(url, params=params) as response:
                     if response.status == 200:
                         content = await response.text()
-                        self.cache.set(cache_key, {"content": content})
+                        await asyncio.to_thread(self.cache.set, cache_key, {"content": content})
                         return content
                     return None
         except Exception as e:
@@ -59,18 +59,19 @@ class ScrapingService:
         if not html:
             return None
             
-        soup = BeautifulSoup(html, 'html.parser')
+        # Parser HTML in C (selectolax): molto più rapido di html.parser di BeautifulSoup
+        tree = HTMLParser(html)
         
         try:
             # Estrai dati da pagina prodotto
-            title = soup.find("h1", {"class": "details-title"}).text.strip()
-            price = float(soup.find("div", {"class": "price"}).text.replace("€", "").strip())
-            description = soup.find("div", {"class": "description"}).text.strip()
+            title = tree.css_first("h1.details-title").text().strip()
+            price = float(tree.css_first("div.price").text().replace("€", "").strip())
+            description = tree.css_first("div.description").text().strip()
             
             details = {}
-            for row in soup.find_all("div", {"class": "details-list__item"}):
-                key = row.find("div", {"class": "details-list__item-title"}).text.strip().lower()
-                value = row.find("div", {"class": "details-list__item-value"}).text.strip()
+            for row in tree.css("div.details-list__item"):
+                key = row.css_first("div.details-list__item-title").text().strip().lower()
+                value = row.css_first("div.details-list__item-value").text().strip()
                 details[key] = value
             
             return {
@@ -4,7 +4,7 @@
 # ============================================================================
 
 import streamlit as st
-import json
+import orjson
 from models.listing import ListingData
 
 class ExportComponent:
@@ -31,7 +31,7 @@ class ExportComponent:
             
             st.download_button(
                 label="Scarica JSON",
-                data=json.dumps(json_data, indent=2, ensure_ascii=False),
+                data=orjson.dumps(json_data, option=orjson.OPT_INDENT_2),  # UTF-8, accenti ed emoji non escapati
                 file_name="vinted_listing.json",
                 mime="application/json"
             )
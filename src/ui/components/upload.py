@@ -4,48 +4,55 @@
 # ============================================================================
 
 import streamlit as st
-from PIL import Image
-import io
 from typing import List, Dict, Optional
 from utils.image_utils import ImageProcessor  
-from utils.validation import InputValidator  
 
 class ImageUploadComponent:
     """Componente per upload e preview immagine"""
     
     def __init__(self):
         self.processor = ImageProcessor()
-        self.validator = InputValidator()
     
-    def render(self) -> Optional[bytes]:
-        """Renderizza componente e ritorna dati immagine"""
+    def render(self) -> Optional[List[bytes]]:
+        """Renderizza componente e ritorna i dati delle immagini (una o più foto dello stesso capo)"""
         
         st.subheader("📷 Carica foto del capo")
         
-        uploaded_file = st.file_uploader(
-            "Seleziona un'immagine",
+        uploaded_files = st.file_uploader(
+            "Seleziona una o più immagini",
             type=['png', 'jpg', 'jpeg'],
-            help="Carica una foto chiara del capo di abbigliamento"
+            accept_multiple_files=True,
+            help="Carica foto chiare del capo (es. fronte, retro, etichetta): vengono analizzate insieme"
         )
         
-        if uploaded_file:
+        if uploaded_files:
             try:
-                image_data = uploaded_file.getvalue()
+                # Bytes e validazione calcolati una volta per file, riusati nei rerun successivi
+                upload_id = tuple((f.name, f.size) for f in uploaded_files)
+                cached = st.session_state.get("_upload")
+                if cached is None or cached[0] != upload_id:
+                    images = [f.getvalue() for f in uploaded_files]
+                    cached = (upload_id, images, self.processor.validate_many(images))
+                    st.session_state["_upload"] = cached
                 
-                # Validazione
-                valid, msg = self.validator.validate_image_file(uploaded_file.name)
-                if not valid:
-                    st.warning(f"Problema con l'immagine: {msg}")
+                _, images, validations = cached
+                
+                # Validazione del contenuto (formato, dimensioni, integrità): segnala ogni file scartato
+                rejected = False
+                for uploaded_file, (valid, msg) in zip(uploaded_files, validations):
+                    if not valid:
+                        st.warning(f"Problema con l'immagine {uploaded_file.name}: {msg}")
+                        rejected = True
+                if rejected:
                     return None
                 
-                # Preview
-                image = Image.open(io.BytesIO(image_data))
-                st.image(image, caption="Anteprima immagine", width=300)
+                # Preview direttamente dai bytes in cache (nessuna decodifica PIL a ogni rerun)
+                st.image(images, caption=["Anteprima immagine"] * len(images), width=300)
                 
-                return image_data
+                return images
                 
             except Exception as e:
                 st.error(f"Errore nel caricamento dell'immagine: {str(e)}")
                 return None
         
-        return None
\ No newline at end of file
+        return None
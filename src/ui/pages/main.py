@@ -4,14 +4,101 @@
 # ============================================================================
 
 
+import asyncio
+import concurrent.futures
+import hashlib
+import queue
+import threading
 import streamlit as st
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, List
 from core.autolister import VintedAutoLister
+from core.price_scraper import VintedPriceScraper
 from models.listing import ListingResult
 from ui.components.upload import ImageUploadComponent
 from ui.components.preview import PreviewComponent
 from ui.components.export import ExportComponent
 
+@st.cache_resource(show_spinner=False)
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Event loop persistente in un thread dedicato: le connessioni HTTP restano aperte tra i click"""
+    
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="autolister-loop", daemon=True).start()
+    return loop
+
+@st.cache_resource(show_spinner=False)
+def get_price_scraper() -> VintedPriceScraper:
+    """Scraper unico per tutte le chiavi OpenAI: sessione HTTP e cache prezzi condivise"""
+    return VintedPriceScraper()
+
+@st.cache_resource(show_spinner=False)
+def get_autolister(openai_key: str) -> VintedAutoLister:
+    """Autolister condiviso tra i rerun di Streamlit (uno per chiave OpenAI, usata solo dalle sue chiamate)"""
+    return VintedAutoLister(openai_key or None, price_scraper=get_price_scraper())
+
+# Risultati in cache per (hash immagini, input): i click ripetuti non rieseguono la pipeline
+RESULT_CACHE_TTL = 3600  # secondi
+RESULT_CACHE_MAX_ENTRIES = 64
+
+@st.cache_data(show_spinner=False, ttl=RESULT_CACHE_TTL, max_entries=RESULT_CACHE_MAX_ENTRIES)
+def cached_listing(
+    images_hash: str,
+    size: str,
+    condition: str,
+    target_speed: str,
+    content_style: str,
+    openai_key: str,
+    _result: Optional[ListingResult] = None
+) -> ListingResult:
+    """Risultato in cache per (hash immagini, input): senza _result è un miss (le eccezioni non vengono memorizzate)"""
+    
+    if _result is None:
+        raise KeyError(images_hash)
+    return _result
+
+def generate_listing(
+    images_hash: str,
+    images: List[bytes],
+    size: str,
+    condition: str,
+    target_speed: str,
+    content_style: str,
+    openai_key: str,
+    on_content: Optional[Callable[[str], None]] = None
+) -> "concurrent.futures.Future[ListingResult]":
+    """Avvia la pipeline completa sul loop condiviso, o restituisce il risultato in cache per (hash immagini, input)"""
+    
+    try:
+        cached = cached_listing(
+            images_hash,
+            size=size,
+            condition=condition,
+            target_speed=target_speed,
+            content_style=content_style,
+            openai_key=openai_key
+        )
+    except KeyError:
+        pass
+    else:
+        future = concurrent.futures.Future()
+        future.set_result(cached)
+        return future
+    
+    # Esegui processing sul loop condiviso (Streamlit non supporta async nativamente)
+    autolister = get_autolister(openai_key)
+    future = asyncio.run_coroutine_threadsafe(
+        autolister.process_images_bytes(
+            images=images,
+            size=size,
+            condition=condition,
+            target_sale_speed=target_speed,
+            content_style=content_style,
+            on_content=on_content
+        ),
+        get_event_loop()
+    )
+    return future
+
 class MainPage:
     """Pagina principale dell'applicazione"""
     
@@ -27,9 +114,9 @@ class MainPage:
             st.header("⚙️ Configurazione")
             
             self.openai_key = st.text_input(
-                "OpenAI API Key (opzionale)",
+                "OpenAI API Key",
                 type="password",
-                help="Per analisi AI avanzata. Lascia vuoto per usare template predefiniti."
+                help="Necessaria per l'analisi dell'immagine. Le descrizioni usano l'AI se la chiave è presente."
             )
             
             self.target_speed = st.selectbox(
@@ -79,6 +166,52 @@ class MainPage:
             "condition": condition
         }
     
+    def _generate_listing(self, images: List[bytes], form_data: Dict[str, Any]) -> ListingResult:
+        """Genera l'annuncio (la chiave di cache usa l'hash delle immagini, non i bytes)"""
+        
+        digest = hashlib.blake2b(digest_size=16)
+        for image_data in images:
+            digest.update(hashlib.blake2b(image_data, digest_size=16).digest())
+        images_hash = digest.hexdigest()
+        
+        # Il testo generato arriva dal thread del loop: lo mostriamo da qui mentre la pipeline gira
+        updates: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        preview = st.empty()
+        
+        future = generate_listing(
+            images_hash,
+            images,
+            size=form_data["size"],
+            condition=form_data["condition"],
+            target_speed=self.target_speed,
+            content_style=self.content_style,
+            openai_key=self.openai_key or "",
+            on_content=updates.put
+        )
+        
+        while not future.done():
+            concurrent.futures.wait([future], timeout=0.1)
+            
+            # Solo l'ultimo testo accumulato: un aggiornamento UI per intervallo
+            text = None
+            while not updates.empty():
+                text = updates.get_nowait()
+            if text is not None:
+                preview.code(text, language="json")
+        
+        preview.empty()
+        
+        # Salvato dal thread dello script: solo i risultati riusciti arrivano in cache
+        return cached_listing(
+            images_hash,
+            size=form_data["size"],
+            condition=form_data["condition"],
+            target_speed=self.target_speed,
+            content_style=self.content_style,
+            openai_key=self.openai_key or "",
+            _result=future.result()
+        )
+    
     def render(self):
         """Renderizza pagina principale"""
         
@@ -97,51 +230,47 @@ class MainPage:
         col1, col2 = st.columns([1, 1])
         
         with col1:
-            # Upload immagine
-            image_data = self.upload_component.render()
+            # Upload immagini fuori dal form: anteprima e validazione subito dopo il caricamento
+            images = self.upload_component.render()
             
-            # Input form
-            form_data = self.render_input_form()
-            
-            # Pulsante genera
-            generate_btn = st.button("🚀 Genera Annuncio", type="primary")
+            # Form: i parametri non provocano rerun finché non si preme il pulsante
+            with st.form("product_form"):
+                # Input form
+                form_data = self.render_input_form()
+                
+                # Pulsante genera
+                generate_btn = st.form_submit_button("🚀 Genera Annuncio", type="primary")
         
         with col2:
-            if generate_btn and image_data and form_data:
+            if generate_btn and not self.openai_key:
+                # Senza chiave l'analisi immagine fallirebbe dopo aver fatto lavoro inutile
+                st.info("ℹ️ Inserisci una API key OpenAI nella barra laterale per analizzare l'immagine")
+            
+            elif generate_btn and images and form_data:
                 with st.spinner("Analizzo l'immagine e genero l'annuncio..."):
                     try:
-                        autolister = VintedAutoLister(self.openai_key)
-                        
-                        # Esegui processing (nota: Streamlit non supporta async nativamente)
-                        import asyncio
-                        result = asyncio.run(
-                            autolister.process_image(
-                                image_data=image_data,
-                                size=form_data["size"],
-                                condition=form_data["condition"],
-                                target_sale_speed=self.target_speed,
-                                content_style=self.content_style
-                            )
-                        )
-                        
-                        # Mostra risultati
+                        st.session_state["last_result"] = self._generate_listing(images, form_data)
                         st.success("✅ Annuncio generato con successo!")
                         
-                        # Preview
-                        self.preview_component.render(
-                            result.listing,
-                            {
-                                "price_range": result.market_analysis.price_range,
-                                "total_listings": result.market_analysis.total_listings,
-                                "market_position": result.market_analysis.market_position
-                            }
-                        )
-                        
-                        # Esportazione
-                        self.export_component.render(result.listing)
-                        
                     except Exception as e:
+                        st.session_state.pop("last_result", None)
                         st.error(f"Errore nella generazione annuncio: {str(e)}")
             
             elif generate_btn:
-                st.warning("⚠️ Completa tutti i campi per generare l'annuncio")
\ No newline at end of file
+                st.warning("⚠️ Completa tutti i campi per generare l'annuncio")
+            
+            # Ultimo risultato: resta visibile nei rerun (download, sidebar) senza ricalcolo
+            result = st.session_state.get("last_result")
+            if result:
+                # Preview
+                self.preview_component.render(
+                    result.listing,
+                    {
+                        "price_range": result.market_analysis.price_range,
+                        "total_listings": result.market_analysis.total_listings,
+                        "market_position": result.market_analysis.market_position
+                    }
+                )
+                
+                # Esportazione
+                self.export_component.render(result.listing)
\ No newline at end of file
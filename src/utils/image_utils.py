@@ -3,65 +3,175 @@
 # Utilities per processamento immagini
 # ============================================================================
 
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image, ImageFilter, ImageStat
 import io
-from typing import Tuple
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Optional, Sequence, Tuple, Union
+
+CONTRAST_FACTOR = 1.1
+SHARPNESS_FACTOR = 1.05
+
+def _kernel_weights(kernel: ImageFilter.Kernel) -> List[float]:
+    """Pesi normalizzati di un filtro kernel di Pillow"""
+    
+    _, scale, _, weights = kernel.filterargs
+    return [w / scale for w in weights]
+
+def _build_enhance_kernel() -> ImageFilter.Kernel:
+    """Kernel 5x5 unico equivalente a Sharpness(SHARPNESS_FACTOR) seguita da SMOOTH_MORE"""
+    
+    # Sharpness = blend con SMOOTH: f * identità + (1 - f) * SMOOTH (3x3)
+    sharpen = [(1 - SHARPNESS_FACTOR) * w for w in _kernel_weights(ImageFilter.SMOOTH)]
+    sharpen[4] += SHARPNESS_FACTOR
+    smooth_more = _kernel_weights(ImageFilter.SMOOTH_MORE)
+    
+    # Convoluzione 5x5 * 3x3 = 7x7; l'anello esterno pesa ~0.2% e viene scartato
+    full = [0.0] * 49
+    for i in range(5):
+        for j in range(5):
+            for k in range(3):
+                for l in range(3):
+                    full[(i + k) * 7 + j + l] += smooth_more[i * 5 + j] * sharpen[k * 3 + l]
+    
+    weights = [full[(i + 1) * 7 + j + 1] for i in range(5) for j in range(5)]
+    total = sum(weights)
+    return ImageFilter.Kernel((5, 5), [w / total for w in weights], scale=1)
+
+# Calcolato una volta all'import
+_ENHANCE_KERNEL = _build_enhance_kernel()
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# Marker JPEG Start Of Frame (C4, C8 e CC sono DHT, JPG e DAC)
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+def _parse_image_header(data: bytes) -> Optional[Tuple[str, int, int]]:
+    """Formato e dimensioni letti dall'header PNG/JPEG/WEBP (None se non riconosciuto)"""
+    
+    if data[:8] == _PNG_SIGNATURE and data[12:16] == b'IHDR':
+        width, height = struct.unpack('>II', data[16:24])
+        return 'PNG', width, height
+    
+    if data[:2] == b'\xff\xd8':
+        # Scorre i segmenti fino al primo SOF (dopo eventuali APPn/EXIF)
+        offset = 2
+        while offset + 9 <= len(data):
+            if data[offset] != 0xFF:
+                return None
+            marker = data[offset + 1]
+            if marker == 0xFF:
+                offset += 1
+                continue
+            if marker in _JPEG_SOF_MARKERS:
+                height, width = struct.unpack('>HH', data[offset + 5:offset + 9])
+                return 'JPEG', width, height
+            offset += 2 + struct.unpack('>H', data[offset + 2:offset + 4])[0]
+        return None
+    
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP' and len(data) >= 30:
+        chunk = data[12:16]
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', data[26:30])
+            return 'WEBP', width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L':
+            bits = struct.unpack('<I', data[21:25])[0]
+            return 'WEBP', (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X':
+            width = int.from_bytes(data[24:27], 'little') + 1
+            height = int.from_bytes(data[27:30], 'little') + 1
+            return 'WEBP', width, height
+    
+    return None
 
 class ImageProcessor:
     """Utilities per processamento e ottimizzazione immagini"""
     
     @staticmethod
-    def resize_maintain_aspect(image: Image.Image, max_size: int) -> Image.Image:
-        """Ridimensiona mantenendo aspect ratio"""
+    def resize_maintain_aspect(
+        image: Image.Image,
+        max_size: int,
+        resampling: Image.Resampling = Image.Resampling.BILINEAR
+    ) -> Image.Image:
+        """Riduce mantenendo aspect ratio (in place; nessun resample se già entro max_size)"""
         
-        width, height = image.size
+        if max(image.size) <= max_size:
+            return image
         
-        if width > height:
-            new_width = max_size
-            new_height = int((height * max_size) / width)
-        else:
-            new_height = max_size
-            new_width = int((width * max_size) / height)
-        
-        return image.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        # thumbnail riduce prima con reduce() (box filter) e rifinisce con il filtro scelto:
+        # BILINEAR basta per le immagini destinate al modello, LANCZOS per anteprime mostrate all'utente
+        image.thumbnail((max_size, max_size), resampling)
+        return image
     
     @staticmethod
     def enhance_quality(image: Image.Image) -> Image.Image:
         """Migliora qualità immagine per analisi AI"""
         
-        # Contrasto
-        enhancer = ImageEnhance.Contrast(image)
-        image = enhancer.enhance(1.1)
+        # Contrasto attorno alla luminanza media (come ImageEnhance.Contrast), applicato con una LUT
+        mean = int(ImageStat.Stat(image.convert("L")).mean[0] + 0.5)
+        contrast = [
+            min(255, max(0, round(mean + CONTRAST_FACTOR * (v - mean))))
+            for v in range(256)
+        ]
+        lut = []
+        for band in image.getbands():
+            lut.extend(range(256) if band == "A" else contrast)
         
-        # Nitidezza
-        enhancer = ImageEnhance.Sharpness(image)
-        image = enhancer.enhance(1.05)
-        
-        # Slight denoising
-        image = image.filter(ImageFilter.SMOOTH_MORE)
-        
-        return image
+        # Nitidezza + slight denoising in una sola convoluzione, poi contrasto (lineare: commuta col filtro)
+        return image.filter(_ENHANCE_KERNEL).point(lut)
     
     @staticmethod
-    def validate_image(image_data: bytes) -> Tuple[bool, str]:
-        """Valida se immagine è utilizzabile"""
+    def validate_image(image_source: Union[bytes, BinaryIO]) -> Tuple[bool, str]:
+        """Valida se immagine è utilizzabile (bytes o file già aperto, es. UploadedFile di Streamlit)"""
         
         try:
-            image = Image.open(io.BytesIO(image_data))
+            # Bytes in formato noto: header letto direttamente, senza Pillow per gli scarti
+            is_buffer = isinstance(image_source, (bytes, bytearray, memoryview))
+            header = _parse_image_header(image_source) if is_buffer else None
+            
+            if header is not None:
+                image_format, width, height = header
+            else:
+                # Un file-like viene letto direttamente, senza copiarne il contenuto in un nuovo buffer
+                if is_buffer:
+                    image_source = io.BytesIO(image_source)
+                else:
+                    image_source.seek(0)
+                
+                # Formato e dimensioni dall'header, verify() controlla l'integrità: nessun pixel decodificato
+                with Image.open(image_source) as image:
+                    image_format = image.format
+                    width, height = image.size
+                    image.verify()
             
             # Check formato
-            if image.format not in ['JPEG', 'PNG', 'WEBP']:
+            if image_format not in ['JPEG', 'PNG', 'WEBP']:
                 return False, "Formato non supportato"
             
             # Check dimensioni minime
-            if image.width < 200 or image.height < 200:
+            if width < 200 or height < 200:
                 return False, "Immagine troppo piccola (min 200x200)"
             
             # Check dimensioni massime
-            if image.width > 4000 or image.height > 4000:
+            if width > 4000 or height > 4000:
                 return False, "Immagine troppo grande (max 4000x4000)"
             
+            if header is not None:
+                # L'header basta per scartare, ma un'immagine accettata va verificata (file troncati o corrotti)
+                with Image.open(io.BytesIO(image_source)) as image:
+                    image.verify()
+            
             return True, "OK"
             
         except Exception as e:
-            return False, f"Errore validazione: {str(e)}"
\ No newline at end of file
+            return False, f"Errore validazione: {str(e)}"
+    
+    @staticmethod
+    def validate_many(images: Sequence[Union[bytes, BinaryIO]]) -> List[Tuple[bool, str]]:
+        """Valida più immagini in parallelo (thread: la decodifica di Pillow rilascia il GIL)"""
+        
+        if len(images) <= 1:
+            return [ImageProcessor.validate_image(image) for image in images]
+        
+        with ThreadPoolExecutor(max_workers=min(32, len(images))) as executor:
+            return list(executor.map(ImageProcessor.validate_image, images))
\ No newline at end of file
@@ -3,8 +3,114 @@
 # Utilities per processamento testo
 # ============================================================================
 
+import json
 import re
-from typing import List, Dict
+import orjson
+from typing import Any, Callable, List, Dict, Optional
+
+# pyahocorasick (opzionale, extra "speedups"): automa Aho-Corasick in C per la ricerca multi-alias
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Alias per normalizzazione (tabelle costanti, non ricostruite a ogni chiamata)
+BRAND_ALIASES = {
+    'nike': ('nike', 'just do it'),
+    'adidas': ('adidas', 'three stripes'),
+    'zara': ('zara', 'zara man', 'zara woman'),
+    'h&m': ('h&m', 'hm', 'hennes mauritz'),
+    'uniqlo': ('uniqlo', 'uniqlo u')
+}
+
+TYPE_ALIASES = {
+    'felpa': ('felpa', 'hoodie', 'sweatshirt', 'pullover'),
+    't-shirt': ('t-shirt', 'tshirt', 'maglietta', 'maglia'),
+    'jeans': ('jeans', 'denim', 'pantaloni'),
+    'scarpe': ('scarpe', 'scarpa', 'sneakers', 'tennis', 'shoes'),
+    'giacca': ('giacca', 'giacche', 'giaccone', 'giubbotto', 'jacket'),
+    'camicia': ('camicia', 'shirt', 'button down')
+}
+
+SIZE_ALIASES = {
+    'xs': ('xs', 'extra small'),
+    's': ('s', 'small'),
+    'm': ('m', 'medium'),
+    'l': ('l', 'large'),
+    'xl': ('xl', 'extra large'),
+    'xxl': ('xxl', '2xl', 'extra extra large'),
+    'unica': ('unica', 'one size', 'os')
+}
+
+def _alias_lookup(aliases: Dict[str, tuple]) -> Dict[str, str]:
+    """Indice inverso alias -> valore principale"""
+    return {alias: main for main, values in aliases.items() for alias in values}
+
+def _alias_matcher(lookup: Dict[str, str]) -> Callable[[str], Optional[str]]:
+    """Ricerca del primo alias nel testo (il più lungo a parità di inizio, es. 'zara woman' prima di 'zara')"""
+    
+    if ahocorasick is not None:
+        # Una sola passata sui caratteri del testo, indipendente dal numero di alias
+        automaton = ahocorasick.Automaton()
+        for alias, main in lookup.items():
+            automaton.add_word(alias, main)
+        automaton.make_automaton()
+        
+        def search(text: str) -> Optional[str]:
+            match = next(automaton.iter_long(text), None)
+            return match[1] if match else None
+        
+        return search
+    
+    pattern = re.compile('|'.join(re.escape(alias) for alias in sorted(lookup, key=len, reverse=True)))
+    
+    def search(text: str) -> Optional[str]:
+        match = pattern.search(text)
+        return lookup[match.group(0)] if match else None
+    
+    return search
+
+_match_brand = _alias_matcher(_alias_lookup(BRAND_ALIASES))
+_match_type = _alias_matcher(_alias_lookup(TYPE_ALIASES))
+
+_SIZE_LOOKUP = {alias: main.upper() for alias, main in _alias_lookup(SIZE_ALIASES).items()}
+
+# Pattern di TextValidator.clean_text (compilati una sola volta)
+_EMOJI_RUN_RE = re.compile(r'([^\w\s])\1{2,}')
+_UNSAFE_CHARS_RE = re.compile(r'[^\w\s.,!?€$#@%&*+-]')
+
+# Almeno una lettera (\w senza cifre e underscore): la ricerca si ferma alla prima
+_HAS_ALPHA_RE = re.compile(r'[^\W\d_]')
+
+# Decoder C di stdlib: raw_decode legge un oggetto JSON da una posizione qualsiasi del testo
+_JSON_DECODER = json.JSONDecoder()
+
+def extract_json_object(text: str) -> Dict[str, Any]:
+    """Primo oggetto JSON valido nel testo, anche se circondato da prosa o blocchi ```json"""
+    
+    # Casi comuni, con orjson: il testo è il solo JSON, oppure il JSON è racchiuso in prosa o ```json
+    start = text.find('{')
+    for span in (text, text[start:text.rfind('}') + 1] if start != -1 else None):
+        if not span:
+            continue
+        try:
+            data = orjson.loads(span)
+        except orjson.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    
+    # Scansione strutturale da ogni '{' (annidamenti e stringhe gestiti dal decoder, nessun backtracking)
+    while start != -1:
+        try:
+            data, _ = _JSON_DECODER.raw_decode(text, start)
+        except json.JSONDecodeError:
+            data = None
+        if isinstance(data, dict):
+            return data
+        start = text.find('{', start + 1)
+    
+    raise ValueError("No JSON object found in text")
 
 class TextNormalizer:
     """Normalizza testi per ricerche e confronti"""
@@ -13,67 +119,25 @@ class TextNormalizer:
     def normalize_brand(brand: str) -> str:
         """Normalizza nome brand"""
         
-        # Mapping brand comuni
-        brand_aliases = {
-            'nike': ['nike', 'just do it'],
-            'adidas': ['adidas', 'three stripes'],
-            'zara': ['zara', 'zara man', 'zara woman'],
-            'h&m': ['h&m', 'hm', 'hennes mauritz'],
-            'uniqlo': ['uniqlo', 'uniqlo u']
-        }
-        
         normalized = brand.lower().strip()
         
-        # Trova brand principale
-        for main_brand, aliases in brand_aliases.items():
-            if any(alias in normalized for alias in aliases):
-                return main_brand
-        
-        return normalized
+        # Trova brand principale (primo alias presente nel testo)
+        return _match_brand(normalized) or normalized
     
     @staticmethod
     def normalize_item_type(item_type: str) -> str:
         """Normalizza tipo articolo"""
         
-        type_aliases = {
-            'felpa': ['felpa', 'hoodie', 'sweatshirt', 'pullover'],
-            't-shirt': ['t-shirt', 'tshirt', 'maglietta', 'maglia'],
-            'jeans': ['jeans', 'denim', 'pantaloni'],
-            'scarpe': ['scarpe', 'scarpa', 'sneakers', 'tennis', 'shoes'],
-            'giacca': ['giacca', 'giacche', 'giaccone', 'giubbotto', 'jacket'],
-            'camicia': ['camicia', 'shirt', 'button down']
-        }
-        
         normalized = item_type.lower().strip()
         
-        # Trova tipo principale
-        for main_type, aliases in type_aliases.items():
-            if any(alias in normalized for alias in aliases):
-                return main_type
-        
-        return normalized
+        # Trova tipo principale (primo alias presente nel testo)
+        return _match_type(normalized) or normalized
     
     @staticmethod
     def normalize_size(size: str) -> str:
         """Normalizza taglia abbigliamento"""
         
-        size_mapping = {
-            'xs': ['xs', 'extra small'],
-            's': ['s', 'small'],
-            'm': ['m', 'medium'],
-            'l': ['l', 'large'],
-            'xl': ['xl', 'extra large'],
-            'xxl': ['xxl', '2xl', 'extra extra large'],
-            'unica': ['unica', 'one size', 'os']
-        }
-        
-        normalized = size.lower().strip()
-        
-        for main_size, aliases in size_mapping.items():
-            if normalized in aliases:
-                return main_size.upper()
-        
-        return size.upper()
+        return _SIZE_LOOKUP.get(size.lower().strip(), size.upper())
 
 class TextValidator:
     """Validazione e pulizia testi per listing"""
@@ -83,10 +147,10 @@ class TextValidator:
         """Pulisce testo rimuovendo caratteri problematici"""
         
         # Rimuovi emoji eccessive
-        cleaned = re.sub(r'([^\w\s])\1{2,}', r'\1', text)
+        cleaned = _EMOJI_RUN_RE.sub(r'\1', text)
         
         # Rimuovi caratteri speciali pericolosi
-        cleaned = re.sub(r'[^\w\s.,!?€$#@%&*+-]', '', cleaned)
+        cleaned = _UNSAFE_CHARS_RE.sub('', cleaned)
         
         # Normalizza spazi
         cleaned = ' '.join(cleaned.split())
@@ -100,7 +164,7 @@ class TextValidator:
         if len(title) < 5 or len(title) > 60:
             return False
         
-        if not any(c.isalpha() for c in title):
+        if not _HAS_ALPHA_RE.search(title):
             return False
             
         return True
@@ -112,7 +176,7 @@ class TextValidator:
         if len(desc) < 20 or len(desc) > 2000:
             return False
             
-        if not any(c.isalpha() for c in desc):
+        if not _HAS_ALPHA_RE.search(desc):
             return False
             
         return True
\ No newline at end of file
@@ -7,6 +7,15 @@ from typing import Optional, Tuple
 from pathlib import Path
 from src.models.product import Condition
 
+# Taglie ammesse (ordine conservato per il messaggio di errore)
+_SIZES = ('XS', 'S', 'M', 'L', 'XL', 'XXL', 'UNICA')
+_VALID_SIZES = frozenset(_SIZES)
+_SIZES_MSG = f"Taglia non valida (usa {', '.join(_SIZES)})"
+
+# Condizioni ammesse (membership O(1), nessuna eccezione nel percorso di validazione)
+_VALID_CONDITIONS = frozenset(c.value for c in Condition)
+_CONDITIONS_MSG = f"Condizione non valida (usa {', '.join(c.value for c in Condition)})"
+
 class InputValidator:
     """Validazione input utente e file"""
     
@@ -31,10 +40,8 @@ class InputValidator:
     def validate_size(size: str) -> Tuple[bool, Optional[str]]:
         """Valida taglia abbigliamento"""
         
-        valid_sizes = ['XS', 'S', 'M', 'L', 'XL', 'XXL', 'UNICA']
-        
-        if size.upper() not in valid_sizes:
-            return False, f"Taglia non valida (usa {', '.join(valid_sizes)})"
+        if size.upper() not in _VALID_SIZES:
+            return False, _SIZES_MSG
             
         return True, None
     
@@ -42,9 +49,7 @@ class InputValidator:
     def validate_condition(condition: str) -> Tuple[bool, Optional[str]]:
         """Valida condizione articolo"""
         
-        try:
-            Condition(condition)
-            return True, None
-        except ValueError:
-            valid_conditions = [c.value for c in Condition]
-            return False, f"Condizione non valida (usa {', '.join(valid_conditions)})"
\ No newline at end of file
+        if condition not in _VALID_CONDITIONS:
+            return False, _CONDITIONS_MSG
+            
+        return True, None
\ No newline at end of file
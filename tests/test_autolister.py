@@ -0,0 +1,70 @@
+# ============================================================================
+# FILE: tests/test_autolister.py
+# Test orchestrator: ricerca prezzi
+# ============================================================================
+
+import asyncio
+
+from src.core.autolister import VintedAutoLister
+from src.core.price_scraper import VintedPriceScraper
+
+RAW_ITEM = {
+    "id": 123,
+    "title": "Felpa Nike",
+    "price": {"amount": "25.0"},
+    "status": "Ottimo",
+    "brand": {"title": "Nike"},
+    "size_title": "M",
+    "is_sold": True,
+}
+
+async def test_failed_scrape_is_retried_on_next_call(monkeypatch, tmp_path):
+    """Dopo uno scraping fallito (listings fittizi) la chiamata successiva riprova Vinted"""
+    
+    monkeypatch.chdir(tmp_path)
+    scraper = VintedPriceScraper()
+    calls = []
+    
+    async def fetch_listings(search_params, max_results, force_refresh=False):
+        calls.append(search_params)
+        if len(calls) == 1:
+            raise ConnectionError("Vinted non raggiungibile")
+        return [RAW_ITEM]
+    
+    monkeypatch.setattr(scraper, "_fetch_listings_cached", fetch_listings)
+    
+    async with VintedAutoLister(price_scraper=scraper) as autolister:
+        mock_listings = await autolister._search_similar_items("Nike", "felpa", "M")
+        listings = await autolister._search_similar_items("Nike", "felpa", "M")
+    await scraper.aclose()
+    
+    assert len(calls) == 2
+    assert mock_listings
+    assert [listing.url for listing in listings] == [f"{scraper.base_url}/items/123"]
+
+async def test_concurrent_identical_searches_scrape_once(monkeypatch, tmp_path):
+    """N ricerche identiche concorrenti, da autolister diversi sullo stesso scraper, fanno un solo scraping"""
+    
+    monkeypatch.chdir(tmp_path)
+    scraper = VintedPriceScraper()
+    calls = []
+    
+    async def fetch_listings(search_params, max_results, force_refresh=False):
+        calls.append(search_params)
+        await asyncio.sleep(0.05)
+        return [RAW_ITEM]
+    
+    monkeypatch.setattr(scraper, "_fetch_listings_cached", fetch_listings)
+    
+    autolisters = [VintedAutoLister(key, price_scraper=scraper) for key in (None, "sk-test")]
+    results = await asyncio.gather(*(
+        autolisters[i % 2].analyze_price_only("Nike", "felpa", "M", "Buono")
+        for i in range(10)
+    ))
+    
+    for autolister in autolisters:
+        await autolister.aclose()
+    await scraper.aclose()
+    
+    assert len(calls) == 1
+    assert all(result.total_listings == 1 for result in results)
@@ -0,0 +1,35 @@
+# ============================================================================
+# FILE: tests/test_openai_service.py
+# Test wrapper OpenAI: chiave per istanza
+# ============================================================================
+
+import openai
+
+from src.core.autolister import VintedAutoLister
+from src.core.price_scraper import VintedPriceScraper
+
+async def test_autolisters_call_openai_with_their_own_key(monkeypatch, tmp_path):
+    """Autolister con chiavi diverse nello stesso processo (es. Streamlit) usano ognuno la propria"""
+    
+    monkeypatch.chdir(tmp_path)
+    used_keys = []
+    
+    async def acreate(**request):
+        used_keys.append(request["api_key"])
+        return {"choices": [{"message": {"content": "ok"}}]}
+    
+    monkeypatch.setattr(openai.ChatCompletion, "acreate", acreate)
+    
+    scraper = VintedPriceScraper()
+    autolister_a = VintedAutoLister("sk-user-a", price_scraper=scraper)
+    autolister_b = VintedAutoLister("sk-user-b", price_scraper=scraper)
+    
+    await autolister_a.vision_analyzer.openai_service.atext_completion("prompt")
+    await autolister_b.content_generator.openai_service.atext_completion("prompt")
+    await autolister_a.content_generator.openai_service.atext_completion("prompt")
+    
+    for autolister in (autolister_a, autolister_b):
+        await autolister.aclose()
+    await scraper.aclose()
+    
+    assert used_keys == ["sk-user-a", "sk-user-b", "sk-user-a"]